@@ -1,7 +1,19 @@
-from fastapi import FastAPI
+import os
+import json
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from src.chatbot import handle_query  # now safe
+from fastapi.responses import StreamingResponse, JSONResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from src.chatbot import (  # now safe: models load lazily
+    ahandle_query, ahandle_batch, astream_query, asearch_listings, resources, llm_guard, BATCH_MAX_QUERIES,
+)
+
+# "background": start serving immediately and load models in a thread (watch /ready)
+# "blocking": finish loading before accepting traffic; "off": load on first request
+WARMUP_MODE = os.getenv("WARMUP_MODE", "background")
 
 class ChatRequest(BaseModel):
     query: str
@@ -9,8 +21,53 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     answer: str
     cards: list = []
+    retrieval: Optional[dict] = None  # over-fetch rounds / k / hits, see retrieve_records_batch
+    prompt: Optional[dict] = None  # prompt token counts; absent when the answer came from the cache
+    degraded: bool = False  # True: LLM unavailable, summary built from the template
+
+class BatchChatRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=BATCH_MAX_QUERIES)
+
+class BatchChatItem(BaseModel):
+    query: str
+    answer: Optional[str] = None
+    cards: list = []
+    error: Optional[str] = None
+    retrieval: Optional[dict] = None
+    prompt: Optional[dict] = None
+    degraded: bool = False
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatItem]
+
+class SearchResponse(BaseModel):
+    query: str
+    filters: dict
+    page: int
+    page_size: int
+    has_more: bool
+    matching_listings: Optional[int] = None
+    results: list = []
+    retrieval: Optional[dict] = None
+    took_ms: float
 
-app = FastAPI(title="NoBrokerage Chatbot")
+def _log_warmup_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"❌ Warmup failed: {resources.error}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    task = None
+    if WARMUP_MODE == "blocking":
+        await asyncio.to_thread(resources.warmup)
+    elif WARMUP_MODE == "background":
+        task = asyncio.create_task(asyncio.to_thread(resources.warmup))
+        task.add_done_callback(_log_warmup_failure)
+    yield
+    if task is not None and not task.done():
+        task.cancel()
+
+app = FastAPI(title="NoBrokerage Chatbot", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,9 +78,54 @@ app.add_middleware(
 )
 
 @app.post("/chat", response_model=ChatResponse)
-def chat(request: ChatRequest):
-    result = handle_query(request.query)
-    return ChatResponse(answer=result.get("summary"), cards=result.get("cards", []))
+async def chat(request: ChatRequest):
+    result = await ahandle_query(request.query)
+    return ChatResponse(answer=result.get("summary"), cards=result.get("cards", []), retrieval=result.get("retrieval"),
+                        prompt=result.get("prompt"), degraded=result.get("degraded", False))
+
+@app.post("/chat/batch", response_model=BatchChatResponse)
+async def chat_batch(request: BatchChatRequest):
+    """Many queries in one call: embedded and searched together, answered in request order."""
+    results = await ahandle_batch(request.queries)
+    return BatchChatResponse(results=[
+        BatchChatItem(query=q, answer=r.get("summary"), cards=r.get("cards", []), error=r.get("error"),
+                      retrieval=r.get("retrieval"), prompt=r.get("prompt"), degraded=r.get("degraded", False))
+        for q, r in zip(request.queries, results)
+    ])
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Server-sent events: one `cards` event, many `token` events, then `done`."""
+    async def events():
+        async for event, data in astream_query(request.query):
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/search", response_model=SearchResponse)
+async def search(
+    q: str = Query(..., min_length=1),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1, le=50),
+    fallback: bool = False,
+):
+    """Ranked, filtered properties with scores; retrieval only, no LLM call."""
+    return await asearch_listings(q, page=page, page_size=page_size, fallback=fallback)
+
+@app.get("/ready")
+def ready():
+    """Readiness probe: 200 once the embedding model, index and LLM client are loaded."""
+    status = resources.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/metrics")
+def metrics():
+    """LLM call counters (attempts, retries, timeouts, rejected, fallbacks) and circuit breaker state."""
+    return {"llm": llm_guard.metrics()}
 
 @app.get("/")
 def root():
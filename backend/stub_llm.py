@@ -0,0 +1,60 @@
+import os
+import json
+import time
+import random
+import asyncio
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Local stand-in for the Groq chat completions API, to exercise the LLM deadlines,
+# retries and circuit breaker without network:
+#   uvicorn backend.stub_llm:app --port 8001
+#   GROQ_API_BASE=http://127.0.0.1:8001 GROQ_API_KEY=stub uvicorn backend.api:app
+# Behaviour is set by env vars at start-up and can be changed at runtime with
+#   POST /control {"delay": 20, "fail_rate": 0.0, "status": 503}
+STATE = {
+    "delay": float(os.getenv("STUB_LLM_DELAY", "0")),          # seconds before answering
+    "fail_rate": float(os.getenv("STUB_LLM_FAIL_RATE", "0")),  # share of requests answered with `status`
+    "status": int(os.getenv("STUB_LLM_STATUS", "503")),
+}
+REPLY = "These are stub summaries: the listed projects match the query."
+
+app = FastAPI()
+requests_seen = {"total": 0, "failed": 0}
+
+
+@app.post("/control")
+async def control(update: dict):
+    STATE.update({key: value for key, value in update.items() if key in STATE})
+    return dict(STATE, **requests_seen)
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    requests_seen["total"] += 1
+    await asyncio.sleep(STATE["delay"])
+    if random.random() < STATE["fail_rate"]:
+        requests_seen["failed"] += 1
+        return JSONResponse({"error": {"message": "stub failure", "type": "server_error"}}, status_code=STATE["status"])
+
+    model = body.get("model", "stub")
+    created = int(time.time())
+    if not body.get("stream"):
+        return {
+            "id": "stub-1", "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": REPLY}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    async def chunks():
+        for word in REPLY.split(" "):
+            delta = {"id": "stub-1", "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+            yield f"data: {json.dumps(delta)}\n\n"
+        done = {"id": "stub-1", "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        yield f"data: {json.dumps(done)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(chunks(), media_type="text/event-stream")
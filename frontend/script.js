@@ -99,6 +99,7 @@ function createPropertyCard(card) {
       <p class="card-location">📍 ${location}</p>
       ${bhk ? `<p class="card-bhk">🏠 ${bhk}</p>` : ''}
       ${status ? `<p class="card-status">🔑 ${status}</p>` : ''}
+      ${card.variants ? `<p class="card-variants">🧩 ${card.variants} matching variants</p>` : ''}
       ${amenities.length > 0 ? `
         <div class="card-amenities">
           <strong>✨ Amenities:</strong>
@@ -171,7 +172,7 @@ async function aiResponse(userMsg) {
   showTypingIndicator();
   
   try {
-    const response = await fetch(`${API_BASE_URL}/chat`, {
+    const response = await fetch(`${API_BASE_URL}/chat/stream`, {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
@@ -179,15 +180,11 @@ async function aiResponse(userMsg) {
       body: JSON.stringify({ query: userMsg }),
     });
 
-    if (!response.ok) {
+    if (!response.ok || !response.body) {
       throw new Error(`HTTP error! status: ${response.status}`);
     }
 
-    const data = await response.json();
-    removeTypingIndicator();
-    
-    // Display AI response WITHOUT cards - only show text summary
-    addMessage(data.answer, "ai", []);
+    await renderStream(response.body);
     
   } catch (error) {
     removeTypingIndicator();
@@ -199,6 +196,68 @@ async function aiResponse(userMsg) {
   }
 }
 
+// ---------- Streaming (server-sent events from /chat/stream) ----------
+function parseSSE(frame) {
+  let event = "message";
+  const data = [];
+  frame.split("\n").forEach(line => {
+    if (line.startsWith("event:")) event = line.slice(6).trim();
+    else if (line.startsWith("data:")) data.push(line.slice(5).trimStart());
+  });
+  return { event, data: data.length ? JSON.parse(data.join("\n")) : null };
+}
+
+async function renderStream(body) {
+  const reader = body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let summary = "";
+  let cards = [];
+  let msg = null;
+  let bubble = null;
+
+  // Create the AI message on the first event so the typing indicator shows until then
+  const ensureMessage = () => {
+    if (msg) return;
+    removeTypingIndicator();
+    msg = document.createElement("div");
+    msg.classList.add("message", "ai");
+    bubble = document.createElement("div");
+    bubble.classList.add("bubble");
+    msg.appendChild(bubble);
+    chatBox.appendChild(msg);
+  };
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) !== -1) {
+      const { event, data } = parseSSE(buffer.slice(0, sep));
+      buffer = buffer.slice(sep + 2);
+      ensureMessage();
+
+      if (event === "cards" && data && data.length > 0) {
+        cards = data;
+        const cardsContainer = document.createElement("div");
+        cardsContainer.classList.add("property-cards");
+        cards.forEach(card => cardsContainer.appendChild(createPropertyCard(card)));
+        msg.appendChild(cardsContainer);
+      } else if (event === "token") {
+        summary += data;
+        bubble.textContent = summary;
+      }
+      chatBox.scrollTop = chatBox.scrollHeight;
+    }
+  }
+
+  removeTypingIndicator();
+  if (!msg) throw new Error("Empty response stream");
+  if (currentChatId) saveMessageToDB(summary, "ai", cards);
+}
+
 function sendMessage() {
   const text = userInput.value.trim();
   if (!text) return;
@@ -0,0 +1,174 @@
+# cache.py
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+
+class LRUCache:
+    """
+    Small thread-safe LRU cache with an optional TTL (seconds) and hit/miss counters.
+    maxsize <= 0 disables the cache; ttl <= 0 means entries never expire.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, stored_at = item
+                if self.ttl <= 0 or time.monotonic() - stored_at < self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class DiskCache:
+    """
+    SQLite-backed JSON cache, shared by all workers on a host and kept across restarts.
+    Entries carry a `namespace` (e.g. the vectorstore version); entries from any
+    other namespace are purged on open, so a rebuilt index starts with a clean cache.
+    """
+
+    def __init__(self, path: str, namespace: str = "", ttl: float = 0):
+        self.path = path
+        self.namespace = namespace
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, namespace TEXT, value TEXT, stored_at REAL)"
+            )
+            self._conn.execute("DELETE FROM cache WHERE namespace != ?", (namespace,))
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM cache WHERE key = ? AND namespace = ?", (key, self.namespace)
+            ).fetchone()
+            if row is not None and (self.ttl <= 0 or time.time() - row[1] < self.ttl):
+                self.hits += 1
+                return json.loads(row[0])
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, namespace, value, stored_at) VALUES (?, ?, ?, ?)",
+                (key, self.namespace, json.dumps(value, ensure_ascii=False), time.time()),
+            )
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache")
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "path": self.path,
+            "namespace": self.namespace,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class EmbeddingCache:
+    """
+    Persistent vector cache for ingest: float32 BLOBs in SQLite, keyed by a hash of
+    the whitespace-normalized text and a namespace (model + quantization), so a
+    rebuild only embeds text that changed and a model switch never reuses old vectors.
+    """
+
+    def __init__(self, path: str, namespace: str):
+        self.path = path
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(path, timeout=30)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+
+    def key(self, text: str) -> str:
+        normalized = " ".join(text.split())
+        return hashlib.sha256(f"{self.namespace}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """One entry per text: the cached vector, or None on a miss."""
+        keys = [self.key(t) for t in texts]
+        found: Dict[str, bytes] = {}
+        for start in range(0, len(keys), 500):  # stay under SQLite's bound-parameter limit
+            part = keys[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            found.update(self._conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part))
+        vectors = [np.frombuffer(found[k], dtype=np.float32) if k in found else None for k in keys]
+        hits = sum(v is not None for v in vectors)
+        self.hits += hits
+        self.misses += len(vectors) - hits
+        return vectors
+
+    def put_many(self, texts: List[str], vectors: np.ndarray) -> None:
+        rows = [(self.key(t), np.asarray(v, dtype=np.float32).tobytes()) for t, v in zip(texts, vectors)]
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "path": self.path,
+            "namespace": self.namespace,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -2,137 +2,612 @@
 import os
 import re
 import json
-from typing import Dict, Any, List, Tuple, Optional
+import copy
+import asyncio
+import time
+import hashlib
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple, Optional, AsyncIterator, Callable
 
+import faiss
+import numpy as np
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
 from langchain.schema import HumanMessage
+from langchain_core.language_models.chat_models import BaseChatModel, generate_from_stream, agenerate_from_stream
 from langchain_groq import ChatGroq   # groq LLM wrapper
 from langchain.schema import Document
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
 from dotenv import load_dotenv
+from src.embeddings import EMBEDDING_MODEL, load_embeddings
+from src.keyword_index import KeywordIndex, reciprocal_rank_fusion
+from src.metadata_index import MetadataIndex
+from src.cache import LRUCache, DiskCache
+from src.metadata_store import MetadataStore
+from src.query_parser import QueryParser, load_dictionary
+from src.resilience import CircuitBreaker, LLMGuard, LLMUnavailable
+from src.vector_index import (read_index_mmap, load_index_config, configure_index, enable_reconstruct,
+                              search_parameters, max_search_effort)
 load_dotenv()
 
 # -------- Safe absolute path ----------
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # project root
 VECTORSTORE_DIR = os.getenv("VECTORSTORE_DIR", os.path.join(PROJECT_ROOT, "vectorStore"))
+# Memory-map the FAISS index and metadata files so uvicorn workers share one copy
+FAISS_MMAP = os.getenv("FAISS_MMAP", "1") == "1"
+# Optional overrides of the search-time parameters saved by ingest (ANN indexes only)
+IVF_NPROBE = os.getenv("IVF_NPROBE")
+HNSW_EF_SEARCH = os.getenv("HNSW_EF_SEARCH")
 
+# Summarizer backend: groq (default) | llamacpp (local GGUF model on CPU, needs llama-cpp-python)
+# | template (no LLM: deterministic summary from the records, for offline nodes and benchmarks)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")
+LLM_BACKENDS = ("groq", "llamacpp", "template")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+LLAMACPP_MODEL_PATH = os.getenv("LLAMACPP_MODEL_PATH")
+LLAMACPP_CTX = int(os.getenv("LLAMACPP_CTX", "4096"))
+LLAMACPP_THREADS = int(os.getenv("LLAMACPP_THREADS", "0"))  # 0 = llama.cpp default
+LLAMACPP_MAX_TOKENS = int(os.getenv("LLAMACPP_MAX_TOKENS", "256"))
+# Another OpenAI-compatible endpoint for ChatGroq, e.g. the stub in backend/stub_llm.py for tests
+GROQ_API_BASE = os.getenv("GROQ_API_BASE")
+# LLM resilience: deadline per attempt (s), retries with jittered exponential backoff (s),
+# circuit breaker (consecutive failed calls to open it, seconds until a trial call)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "15"))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "4"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+# Threads reserved for query embedding on the async path (kept off Starlette's threadpool)
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "4"))
+# Query-embedding cache (entries, seconds); size 0 disables it
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+# LLM response cache; set RESPONSE_CACHE_DIR to also persist it on disk (shared by workers)
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR")
+# Distinct projects sent to the LLM / shown as cards; hits are collapsed by project first
+RESULT_LIMIT = int(os.getenv("RESULT_LIMIT", "6"))
+# FAISS hits fetched per wanted project, so collapsing variants still leaves RESULT_LIMIT projects
+DEDUP_OVERFETCH = int(os.getenv("DEDUP_OVERFETCH", "4"))
+# Adaptive over-fetch: k is multiplied by OVERFETCH_GROWTH per round while a query still has
+# too few projects after filtering / collapsing, up to OVERFETCH_MAX_K hits
+OVERFETCH_GROWTH = max(2, int(os.getenv("OVERFETCH_GROWTH", "2")))
+OVERFETCH_MAX_K = int(os.getenv("OVERFETCH_MAX_K", "1024"))
+# ... and IVF nprobe / HNSW efSearch by the same factor, up to OVERFETCH_MAX_EFFORT times the configured value
+OVERFETCH_MAX_EFFORT = max(1, int(os.getenv("OVERFETCH_MAX_EFFORT", "16")))
+# Re-rank the collapsed projects with maximal marginal relevance (1 = relevance only)
+RETRIEVAL_MMR = os.getenv("RETRIEVAL_MMR", "0") == "1"
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+# /chat/batch: max queries per request and Groq calls in flight per batch
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "1000"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+# /search: deepest result reachable through pagination
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "200"))
+# Hybrid retrieval: BM25 over project / locality names fused with FAISS (reciprocal rank fusion)
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+RRF_K = int(os.getenv("RRF_K", "60"))
+# query terms found in more than this fraction of projects (e.g. city names) are ignored by BM25
+KEYWORD_MAX_DF = float(os.getenv("KEYWORD_MAX_DF", "0.05"))
+# Token budget for the records part of the summary prompt, measured with the summarizer's tokenizer
+# (~4 chars per token when it is unavailable); low-value fields, then whole records, are dropped to fit
+# Tokenizer for the groq backend: Hugging Face id or local directory (the meta-llama repo is gated:
+# needs HF_TOKEN, or point this at a local copy on offline nodes); empty = chars/4. llamacpp counts
+# with the GGUF model's own vocabulary.
+LLM_TOKENIZER = os.getenv("LLM_TOKENIZER", "meta-llama/Llama-3.1-8B-Instruct")
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "1200"))
+CONTEXT_MAX_AMENITIES = int(os.getenv("CONTEXT_MAX_AMENITIES", "5"))
+CONTEXT_MAX_FIELD_CHARS = int(os.getenv("CONTEXT_MAX_FIELD_CHARS", "80"))
+# Bump whenever the prompts change so cached answers from the old prompt are not reused
+PROMPT_VERSION = "4"
 
-# Load embeddings & vectorstore
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-faiss_index_path = os.path.join(VECTORSTORE_DIR, "index.faiss")
-if not os.path.exists(faiss_index_path):
-    raise FileNotFoundError(f"FAISS index not found at {faiss_index_path}")
-db = FAISS.load_local(VECTORSTORE_DIR, embeddings, allow_dangerous_deserialization=True)
 
-# Instantiate Groq LLM
-
-llm = ChatGroq(
-    api_key=GROQ_API_KEY,
-    model="llama-3.1-8b-instant"  
-)
 # ---------------------------
-# 1) Query parsing helpers
+# 0) Lazily loaded, process-wide resources
 # ---------------------------
-def parse_budget(text: str) -> Optional[float]:
+def load_llm(backend: str = LLM_BACKEND) -> Optional[BaseChatModel]:
+    """Chat model for the configured backend; None for the template backend."""
+    if backend not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM_BACKEND {backend!r}; expected one of {LLM_BACKENDS}")
+    if backend == "template":
+        return None
+    if backend == "groq":
+        return ChatGroq(
+            api_key=GROQ_API_KEY,
+            model=GROQ_MODEL,
+            base_url=GROQ_API_BASE,
+            timeout=LLM_TIMEOUT,
+            max_retries=0,  # retries are done by llm_guard
+        )
+
+    if not LLAMACPP_MODEL_PATH or not os.path.exists(LLAMACPP_MODEL_PATH):
+        raise FileNotFoundError(f"LLM_BACKEND=llamacpp needs LLAMACPP_MODEL_PATH (a GGUF file); got {LLAMACPP_MODEL_PATH!r}")
+    from langchain_community.chat_models import ChatLlamaCpp
+
+    # One llama.cpp context per process, which is not thread-safe, and langchain's async
+    # fallback would advance a sync generator one chunk per executor thread. So every
+    # generation is drained start to finish on this single thread (one at a time, in
+    # arrival order) and its chunks are handed to the caller through a queue.
+    worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llamacpp")
+    done = object()
+
+    def drain(model, messages, stop, kwargs, emit: Callable[[Any], None], cancelled: threading.Event) -> None:
+        """Runs on the llama.cpp thread; stops at the next chunk once the caller has gone away."""
+        if cancelled.is_set():
+            return
+        stream = ChatLlamaCpp._stream(model, messages, stop=stop, **kwargs)
+        try:
+            for chunk in stream:
+                if cancelled.is_set():
+                    return
+                emit(chunk)
+            emit(done)
+        except Exception as e:
+            if not cancelled.is_set():
+                emit(e)
+        finally:
+            stream.close()
+
+    class LocalChatLlamaCpp(ChatLlamaCpp):
+        """ChatLlamaCpp whose generations all run on the dedicated llama.cpp thread."""
+
+        def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+            chunks: queue.Queue = queue.Queue()
+            cancelled = threading.Event()
+            worker.submit(drain, self, messages, stop, kwargs, chunks.put, cancelled)
+            try:
+                while True:
+                    item = chunks.get()
+                    if item is done:
+                        return
+                    if isinstance(item, Exception):
+                        raise item
+                    if run_manager:
+                        run_manager.on_llm_new_token(item.text, chunk=item)
+                    yield item
+            finally:
+                cancelled.set()
+
+        async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+            loop = asyncio.get_running_loop()
+            chunks: asyncio.Queue = asyncio.Queue()
+            cancelled = threading.Event()
+
+            def emit(item: Any) -> None:
+                loop.call_soon_threadsafe(chunks.put_nowait, item)
+
+            worker.submit(drain, self, messages, stop, kwargs, emit, cancelled)
+            try:
+                while True:
+                    item = await chunks.get()
+                    if item is done:
+                        return
+                    if isinstance(item, Exception):
+                        raise item
+                    if run_manager:
+                        await run_manager.on_llm_new_token(item.text, chunk=item)
+                    yield item
+            finally:
+                # deadline (wait_for) or client gone: stop generating
+                cancelled.set()
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            return generate_from_stream(self._stream(messages, stop=stop, run_manager=run_manager, **kwargs))
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            return await agenerate_from_stream(self._astream(messages, stop=stop, run_manager=run_manager, **kwargs))
+
+    return LocalChatLlamaCpp(
+        model_path=LLAMACPP_MODEL_PATH,
+        n_ctx=LLAMACPP_CTX,
+        n_threads=LLAMACPP_THREADS or None,
+        max_tokens=LLAMACPP_MAX_TOKENS,
+        temperature=0.2,
+        verbose=False,
+    )
+
+
+def load_token_counter(llm: Optional[BaseChatModel]) -> Tuple[Optional[Callable[[str], int]], str]:
     """
-    Parse budgets like:
-      - "under ₹1.2 Cr" -> returns numeric rupees (float) e.g. 12000000
-      - "under 1.2cr", "under 12000000"
-    Returns numeric rupee value or None.
+    Token counter matching the summarizer and its name: llama.cpp's tokenize() for the
+    llamacpp backend, the LLM_TOKENIZER Hugging Face tokenizer for groq; (None, "chars/4")
+    when there is none. Loads files (possibly from the Hub), so call it from warmup only.
     """
-    if not text:
-        return None
-    s = text.replace(",", "").lower()
-    # find ₹ or rupee symbols and numbers
-    m = re.search(r"under\s*[₹rs\.]*\s*([0-9]+(?:\.[0-9]+)?)\s*(cr|crore|l|lakhs|lakh|k)?", s)
-    if m:
-        num = float(m.group(1))
-        unit = (m.group(2) or "").lower()
-        if unit in ("cr", "crore"):
-            return num * 1e7
-        if unit in ("l", "lakh", "lakhs"):
-            return num * 1e5
-        if unit in ("k",):
-            return num * 1e3
-        # if no unit assume rupees raw
-        return num
-    # alternative: find direct rupee integers like 12000000
-    m2 = re.search(r"([0-9]{6,})", s)
-    if m2:
-        return float(m2.group(1))
-    return None
-
-
-def parse_bhk(text: str) -> Optional[str]:
-    """Return like '2BHK' or '3BHK' if mentioned."""
-    if not text:
-        return None
-    m = re.search(r"(\d+)\s*-?\s*bhk", text.lower())
-    if m:
-        return f"{m.group(1)}BHK"
-    return None
+    if LLM_BACKEND == "llamacpp" and llm is not None:
+        model = llm.client
+        return (lambda text: len(model.tokenize(text.encode("utf-8"), add_bos=False))), "llama.cpp"
+    if LLM_BACKEND == "groq" and LLM_TOKENIZER:
+        from transformers import AutoTokenizer
 
+        try:  # a cached / local copy first, so a warm node never touches the network
+            tokenizer = AutoTokenizer.from_pretrained(LLM_TOKENIZER, local_files_only=True)
+        except OSError:
+            tokenizer = AutoTokenizer.from_pretrained(LLM_TOKENIZER)
+        return (lambda text: len(tokenizer.encode(text, add_special_tokens=False))), LLM_TOKENIZER
+    return None, "chars/4"
 
-def parse_city(text: str) -> Optional[str]:
-    """Very simple city detection — looks for common city names in text."""
-    if not text:
-        return None
-    s = text.lower()
-    # extend this list as you need
-    cities = ["pune", "mumbai", "delhi", "bangalore", "bangaluru", "chennai", "hyderabad", "kolkata"]
-    for c in cities:
-        if c in s:
-            # standardize "bangaluru" -> "Bangalore" etc if you prefer
-            return c.capitalize() if c != "bangaluru" else "Bangalore"
-    return None
-
-
-def parse_status(text: str) -> Optional[str]:
-    """Detect readiness intents"""
-    s = text.lower()
-    if "ready" in s or "ready to move" in s or "ready-to-move" in s:
-        return "READY_TO_MOVE"
-    if "under construction" in s or "uc" in s or "under-construction" in s:
-        return "UNDER_CONSTRUCTION"
-    return None
-
-
-def parse_locality_or_project(text: str) -> Optional[str]:
-    """Pick up locality words (heuristic). Returns substring if found after 'in' or 'near'."""
-    if not text:
-        return None
-    m = re.search(r"(?:in|near|at)\s+([a-zA-Z0-9\- ]{3,30})", text.lower())
-    if m:
-        return m.group(1).strip().title()
-    return None
 
+class Resources:
+    """
+    Holds the embedding model, FAISS index, metadata store / index and LLM.
+    Nothing is loaded at import time: each resource is created on first use
+    (or by warmup()) exactly once per process, guarded by a lock so concurrent
+    first requests don't load the model twice.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._embeddings = None
+        self._index = None
+        self._store: Optional[MetadataStore] = None
+        self._metadata_index: Optional[MetadataIndex] = None
+        self._keyword_index: Optional[KeywordIndex] = None
+        self._query_parser: Optional[QueryParser] = None
+        self._llm = None
+        self.token_counter: Optional[Callable[[str], int]] = None
+        self.tokenizer = "chars/4"
+        self._response_disk_cache: Optional[DiskCache] = None
+        self.vectorstore_version: Optional[str] = None
+        self.index_config: Dict[str, Any] = {}
+        self._warming = False
+        self.error: Optional[str] = None
+
+    @property
+    def embeddings(self) -> HuggingFaceEmbeddings:
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    # same model / quantization the index was built with
+                    built_with = load_index_config(VECTORSTORE_DIR).get("embedding", {})
+                    self._embeddings = load_embeddings(
+                        model_name=built_with.get("model", EMBEDDING_MODEL),
+                        quantize=built_with.get("quantize", ""),
+                    )
+        return self._embeddings
+
+    @property
+    def index(self) -> faiss.Index:
+        if self._index is None:
+            self._load_vectorstore()
+        return self._index
+
+    @property
+    def store(self) -> MetadataStore:
+        if self._index is None:
+            self._load_vectorstore()
+        return self._store
 
+    @property
+    def metadata_index(self) -> Optional[MetadataIndex]:
+        if self._index is None:
+            self._load_vectorstore()
+        return self._metadata_index
+
+    @property
+    def keyword_index(self) -> Optional[KeywordIndex]:
+        if self._index is None:
+            self._load_vectorstore()
+        return self._keyword_index
+
+    @property
+    def query_parser(self) -> QueryParser:
+        # only needs dictionary.json, so parsing does not wait for the FAISS index
+        if self._query_parser is None:
+            with self._lock:
+                if self._query_parser is None:
+                    self._query_parser = QueryParser(load_dictionary(VECTORSTORE_DIR))
+        return self._query_parser
+
+    @property
+    def llm(self) -> Optional[BaseChatModel]:
+        """The summarizer chat model (see load_llm); None with LLM_BACKEND=template."""
+        if self._llm is None and LLM_BACKEND != "template":
+            with self._lock:
+                if self._llm is None:
+                    self._llm = load_llm(LLM_BACKEND)
+        return self._llm
+
+    @property
+    def response_disk_cache(self) -> Optional[DiskCache]:
+        if self._index is None:
+            self._load_vectorstore()
+        return self._response_disk_cache
+
+    def _load_vectorstore(self) -> None:
+        with self._lock:
+            if self._index is not None:
+                return
+            faiss_index_path = os.path.join(VECTORSTORE_DIR, "index.faiss")
+            store_dir = os.path.join(VECTORSTORE_DIR, "store")
+            for path in (faiss_index_path, store_dir):
+                if not os.path.exists(path):
+                    raise FileNotFoundError(f"{path} not found; build the vectorstore with `python -m src.ingest`")
+            index = read_index_mmap(faiss_index_path) if FAISS_MMAP else faiss.read_index(faiss_index_path)
+            # flat / hnsw / ivf_flat / ivf_pq, whichever ingest built
+            self.index_config = load_index_config(VECTORSTORE_DIR)
+            if IVF_NPROBE:
+                self.index_config["nprobe"] = int(IVF_NPROBE)
+            if HNSW_EF_SEARCH:
+                self.index_config["efSearch"] = int(HNSW_EF_SEARCH)
+            configure_index(index, self.index_config)
+            if RETRIEVAL_MMR:
+                enable_reconstruct(index)
+            store = MetadataStore(store_dir, mmap=FAISS_MMAP)
+            if len(store) != index.ntotal:
+                raise RuntimeError(f"Metadata store has {len(store)} rows but FAISS has {index.ntotal}; re-run ingest.")
+
+            # Changes whenever ingest rewrites the vectorstore; used to invalidate cached responses.
+            # ingest_state.json is bumped by every run (incremental deletes don't touch index.faiss).
+            state_path = os.path.join(VECTORSTORE_DIR, "ingest_state.json")
+            if os.path.exists(state_path):
+                with open(state_path, encoding="utf-8") as f:
+                    self.vectorstore_version = json.load(f).get("version")
+            if not self.vectorstore_version:
+                index_stat = os.stat(faiss_index_path)
+                self.vectorstore_version = f"{int(index_stat.st_mtime)}-{index_stat.st_size}"
+
+            # Columnar metadata index written by ingest.py (optional: older vectorstores only post-filter)
+            metadata_index_dir = os.path.join(VECTORSTORE_DIR, "meta")
+            if os.path.isdir(metadata_index_dir):
+                metadata_index = MetadataIndex.load(metadata_index_dir, mmap=FAISS_MMAP)
+                if len(metadata_index) == index.ntotal:
+                    self._metadata_index = metadata_index
+                else:
+                    print(f"⚠️ Metadata index has {len(metadata_index)} rows but FAISS has {index.ntotal}; re-run ingest. Pre-filtering disabled.")
+
+            # BM25 name index written by ingest.py (optional: without it retrieval is vector-only)
+            keyword_index_dir = os.path.join(VECTORSTORE_DIR, "keywords")
+            if HYBRID_SEARCH and os.path.isdir(keyword_index_dir):
+                keyword_index = KeywordIndex.load(keyword_index_dir, mmap=FAISS_MMAP)
+                if len(keyword_index) == index.ntotal:
+                    self._keyword_index = keyword_index
+                else:
+                    print(f"⚠️ Keyword index has {len(keyword_index)} rows but FAISS has {index.ntotal}; re-run ingest. Hybrid search disabled.")
+
+            if RESPONSE_CACHE_DIR:
+                os.makedirs(RESPONSE_CACHE_DIR, exist_ok=True)
+                self._response_disk_cache = DiskCache(
+                    os.path.join(RESPONSE_CACHE_DIR, "responses.sqlite"),
+                    namespace=self.vectorstore_version,
+                    ttl=RESPONSE_CACHE_TTL,
+                )
+            self._store = store
+            self._index = index
+
+    @property
+    def ready(self) -> bool:
+        """
+        Vectorstore, embedding model and LLM (unless LLM_BACKEND=template) are loaded, by
+        warmup() or lazily by the first requests (WARMUP_MODE=off); False while warmup() runs.
+        """
+        return (not self._warming and self._index is not None and self._embeddings is not None
+                and (LLM_BACKEND == "template" or self._llm is not None))
+
+    def warmup(self) -> None:
+        """Load everything up front and run one forward pass so the first request is not slow."""
+        self._warming = True
+        try:
+            self._load_vectorstore()
+            self.embeddings.embed_query("warmup")
+            _ = self.query_parser
+            _ = self.llm
+            self.load_tokenizer()
+            self.error = None
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._warming = False
+
+    def load_tokenizer(self) -> None:
+        """Load the prompt token counter (see load_token_counter); without it prompts are measured as chars/4."""
+        try:
+            self.token_counter, self.tokenizer = load_token_counter(self.llm)
+        except Exception as e:
+            self.token_counter, self.tokenizer = None, "chars/4"
+            print(f"⚠️ Tokenizer {LLM_TOKENIZER!r} unavailable ({type(e).__name__}: {e}); estimating prompt tokens as chars/4.")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "error": self.error,
+            "embeddings_loaded": self._embeddings is not None,
+            "vectorstore_loaded": self._index is not None,
+            "vectors": self._index.ntotal if self._index is not None else None,
+            "index_type": self.index_config.get("type"),
+            "metadata_index": self._metadata_index is not None,
+            "keyword_index": self._keyword_index is not None,
+            "query_parser_loaded": self._query_parser is not None,
+            "llm_backend": LLM_BACKEND,
+            "llm_circuit": llm_guard.breaker.state,
+            "tokenizer": self.tokenizer,
+            "vectorstore_version": self.vectorstore_version,
+        }
+
+
+resources = Resources()
+llm_guard = LLMGuard(
+    timeout=LLM_TIMEOUT,
+    retries=LLM_RETRIES,
+    backoff_base=LLM_BACKOFF_BASE,
+    backoff_max=LLM_BACKOFF_MAX,
+    breaker=CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET),
+)
+
+
+# ---------------------------
+# 1) Query parsing helpers
+# ---------------------------
 def parse_query(query: str) -> Dict[str, Any]:
-    """Aggregate all parsed filters."""
-    return {
-        "raw": query,
-        "budget_rupees": parse_budget(query),
-        "bhk": parse_bhk(query),
-        "city": parse_city(query),
-        "status": parse_status(query),
-        "locality_or_project": parse_locality_or_project(query),
-    }
+    """Aggregate all parsed filters (one pass, see src/query_parser.py)."""
+    return {"raw": query, **resources.query_parser.parse(query)}
 
 
 # ---------------------------
 # 2) Search + deterministic filter
 # ---------------------------
-def semantic_search(query: str, k: int = 10) -> List[Document]:
+def allowed_mask(filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+    """Rows a filtered search may return, from the metadata index (None: every row)."""
+    metadata_index = resources.metadata_index
+    # the mask also drops rows tombstoned by incremental ingest, so it applies even without filters
+    return metadata_index.mask(filters or {}) if metadata_index is not None else None
+
+
+def search_rows_batch(vectors: List[List[float]], k: int = 10, filters: Optional[Dict[str, Any]] = None,
+                      queries: Optional[List[Optional[str]]] = None, with_scores: bool = False,
+                      mask: Optional[np.ndarray] = None, effort: int = 1) -> List[list]:
+    """
+    Top-k FAISS row ids for each query embedding, best first, in one index.search
+    over the query matrix (all queries share `filters`).
+    With filters and a metadata index, the allowed rows are computed first and
+    passed to FAISS as an IDSelector, so the k results all satisfy the filters.
+    Rows tombstoned by incremental ingest are excluded the same way.
+    Given the query texts, BM25 hits on project / locality names (same mask) are
+    fused in with reciprocal rank fusion.
+    with_scores=True returns (row, score) pairs: cosine similarity for vector-only
+    rankings (MiniLM vectors are unit length, FAISS returns squared L2), the RRF score
+    for fused ones.
+    `mask` is allowed_mask(filters) when the caller already has it; `effort` raises
+    nprobe / efSearch on IVF / HNSW indexes (see search_parameters).
+    """
+    index = resources.index
+    if mask is None:
+        mask = allowed_mask(filters)
+
+    selector = None
+    if mask is not None:
+        if not mask.any():
+            return [[] for _ in vectors]
+        bitmap = np.packbits(mask, bitorder="little")
+        selector = faiss.IDSelectorBitmap(bitmap)
+    params = search_parameters(index, selector, effort)
+    distances, ids = index.search(np.array(vectors, dtype=np.float32), k, params=params)
+    results = [
+        [(int(i), 1.0 - float(d) / 2) for i, d in zip(row_ids, row_distances) if i != -1]
+        for row_ids, row_distances in zip(ids, distances)
+    ]
+
+    keyword_index = resources.keyword_index
+    if queries and keyword_index is not None:
+        for n, query in enumerate(queries):
+            keyword_rows = keyword_index.search(query, k=k, mask=mask, max_df=KEYWORD_MAX_DF) if query else []
+            if keyword_rows:
+                vector_rows = [row for row, _ in results[n]]
+                results[n] = reciprocal_rank_fusion([vector_rows, keyword_rows], k=k, rrf_k=RRF_K)
+    if with_scores:
+        return results
+    return [[row for row, _ in hits] for hits in results]
+
+
+def search_rows(vector: List[float], k: int = 10, filters: Optional[Dict[str, Any]] = None,
+                query: Optional[str] = None) -> List[int]:
+    """Top-k row ids for one query embedding (see search_rows_batch)."""
+    return search_rows_batch([vector], k=k, filters=filters, queries=[query])[0]
+
+
+def get_scored(hits: List[Tuple[int, float]]) -> List[Document]:
+    """Documents for (row, score) hits, with the score in metadata["score"]."""
+    docs = resources.store.get_many(row for row, _ in hits)
+    for doc, (_, score) in zip(docs, hits):
+        doc.metadata["score"] = round(score, 4)
+    return docs
+
+
+def search_by_vector(vector: List[float], k: int = 10, filters: Optional[Dict[str, Any]] = None,
+                     query: Optional[str] = None) -> List[Document]:
+    """Top-k Documents for a query embedding (see search_rows)."""
+    return resources.store.get_many(search_rows(vector, k=k, filters=filters, query=query))
+
+
+query_embedding_cache = LRUCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+
+
+def normalize_query(query: str) -> str:
+    """Cache key for a query: MiniLM is uncased, so case, spacing and trailing punctuation don't matter."""
+    return " ".join(query.lower().split()).strip(" ?!.")
+
+
+def _embed_and_cache(key: str) -> List[float]:
+    vector = resources.embeddings.embed_query(key)
+    query_embedding_cache.put(key, vector)
+    return vector
+
+
+def embed_query(query: str) -> List[float]:
+    """Embed a query, reusing the cached vector for repeated / near-identical queries."""
+    key = normalize_query(query)
+    vector = query_embedding_cache.get(key)
+    return vector if vector is not None else _embed_and_cache(key)
+
+
+def embed_queries(queries: List[str]) -> List[List[float]]:
+    """Embed many queries: cached ones are reused, the rest go through the model in one encode call."""
+    keys = [normalize_query(q) for q in queries]
+    vectors = [query_embedding_cache.get(key) for key in keys]
+    missing = sorted({key for key, vector in zip(keys, vectors) if vector is None})
+    if missing:
+        fresh = dict(zip(missing, resources.embeddings.embed_documents(missing)))
+        for key, vector in fresh.items():
+            query_embedding_cache.put(key, vector)
+        vectors = [vector if vector is not None else fresh[key] for key, vector in zip(keys, vectors)]
+    return vectors
+
+
+def search_projects(vector: List[float], k: int = 10, filters: Optional[Dict[str, Any]] = None,
+                    query: Optional[str] = None) -> List[Document]:
+    """Top-k distinct projects: over-fetch, collapse variants by project, optionally MMR re-rank."""
+    rows = search_rows(vector, k=k * DEDUP_OVERFETCH, filters=filters, query=query)
+    rows, docs = collapse_by_project(rows, resources.store.get_many(rows))
+    return diversify(vector, rows, docs, k)
+
+
+def semantic_search(query: str, k: int = 10, filters: Optional[Dict[str, Any]] = None,
+                    dedup: bool = True) -> List[Document]:
     """
-    Run similarity search over FAISS and return top-k Document objects.
+    Run similarity search over FAISS and return top-k Document objects,
+    one per project unless dedup=False.
     """
-    return db.similarity_search(query, k=k)
+    vector = embed_query(query)
+    if dedup:
+        return search_projects(vector, k=k, filters=filters, query=query)
+    return search_by_vector(vector, k=k, filters=filters, query=query)
+
+
+_embed_executor = ThreadPoolExecutor(max_workers=EMBED_WORKERS, thread_name_prefix="embed")
+
+
+async def aembed_query(query: str) -> List[float]:
+    """Run the (CPU-bound) MiniLM forward pass on a dedicated executor, unless the vector is cached."""
+    key = normalize_query(query)
+    vector = query_embedding_cache.get(key)
+    if vector is not None:
+        return vector
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_embed_executor, _embed_and_cache, key)
+
+
+async def asemantic_search(query: str, k: int = 10, filters: Optional[Dict[str, Any]] = None,
+                            dedup: bool = True) -> List[Document]:
+    """
+    Async variant of semantic_search: the embedding and the FAISS lookup run off
+    the event loop.
+    """
+    vector = await aembed_query(query)
+    if dedup:
+        return await asyncio.to_thread(search_projects, vector, k, filters, query)
+    return await asyncio.to_thread(search_by_vector, vector, k, filters, query)
 
 
 def apply_filters(docs: List[Document], filters: Dict[str, Any]) -> List[Document]:
-    """Filter retrieved docs using structured metadata (price, city, BHK, status, locality)."""
+    """
+    Filter retrieved docs using structured metadata (price, city, BHK, status, locality).
+    Only used for vectorstores built without the metadata index; see filter_mask.
+    """
     budget = filters.get("budget_rupees")
+    min_budget = filters.get("min_budget_rupees")
     bhk = filters.get("bhk")
     city = filters.get("city")
     status = filters.get("status")
@@ -150,25 +625,20 @@ def apply_filters(docs: List[Document], filters: Dict[str, Any]) -> List[Documen
             md_bhk = (md.get("BHK") or md.get("bhk") or "").lower()
             if bhk.lower() not in md_bhk:
                 return False
-        # price filter (budget_rupees)
-        if budget is not None:
-            price = md.get("price") or md.get("price_in_cr")
-            if price is None:
-                return False
+        # price filters (budget_rupees, min_budget_rupees)
+        if budget is not None or min_budget is not None:
             # price might be stored either in rupees (price) or in crores (price_in_cr)
-            if md.get("price") is not None:
-                try:
-                    if float(md.get("price")) > float(budget):
-                        return False
-                except:
-                    return False
-            else:
-                # price_in_cr present
-                try:
-                    if float(md.get("price_in_cr")) * 1e7 > float(budget):
-                        return False
-                except:
-                    return False
+            try:
+                if md.get("price") is not None:
+                    price = float(md.get("price"))
+                else:
+                    price = float(md.get("price_in_cr")) * 1e7
+            except (TypeError, ValueError):
+                return False
+            if budget is not None and price > float(budget):
+                return False
+            if min_budget is not None and price < float(min_budget):
+                return False
         # status filter
         if status:
             md_status = (md.get("status") or "").lower()
@@ -190,51 +660,203 @@ def apply_filters(docs: List[Document], filters: Dict[str, Any]) -> List[Documen
     return filtered
 
 
+def filter_mask(rows: List[int], filters: Dict[str, Any]) -> np.ndarray:
+    """
+    Boolean mask over candidate rows, evaluated on the metadata index's typed columns
+    (price in rupees, interned city / BHK / status codes, locality token postings)
+    without decoding any Document.
+    """
+    metadata_index = resources.metadata_index
+    if metadata_index is not None:
+        return metadata_index.mask_rows(rows, filters)
+    docs = resources.store.get_many(rows)
+    keep = {id(doc) for doc in apply_filters(docs, filters)}
+    return np.array([id(doc) in keep for doc in docs], dtype=bool)
+
+
+def project_key(md: Dict[str, Any]) -> str:
+    """Variants of one project share a slug (projectName / id as fallbacks)."""
+    return str(md.get("slug") or md.get("projectName") or md.get("id") or "").lower()
+
+
+def collapse_by_project(rows: List[int], docs: List[Document]) -> Tuple[List[int], List[Document]]:
+    """
+    Keep the best-ranked variant of every project, in rank order. When a project
+    matched several variants, its kept Document gets metadata["variants"] with
+    their count, BHKs and price range.
+    """
+    groups: Dict[str, List[Tuple[int, Document]]] = {}
+    for row, doc in zip(rows, docs):
+        groups.setdefault(project_key(doc.metadata or {}), []).append((row, doc))
+
+    kept_rows, kept_docs = [], []
+    for hits in groups.values():
+        row, best = hits[0]
+        if len(hits) > 1:
+            prices = [p for p in ((d.metadata or {}).get("price") for _, d in hits) if p]
+            bhks = sorted({(d.metadata or {}).get("BHK") for _, d in hits} - {None, ""})
+            best = Document(page_content=best.page_content, metadata=dict(best.metadata or {}))
+            best.metadata["variants"] = {
+                "count": len(hits),
+                "bhk": bhks,
+                "price_min": min(prices) if prices else None,
+                "price_max": max(prices) if prices else None,
+            }
+        kept_rows.append(row)
+        kept_docs.append(best)
+    return kept_rows, kept_docs
+
+
+def diversify(vector: List[float], rows: List[int], docs: List[Document], limit: int) -> List[Document]:
+    """Top `limit` projects, re-ranked with MMR when RETRIEVAL_MMR is on."""
+    if not RETRIEVAL_MMR or len(docs) <= limit:
+        return docs[:limit]
+    embeddings = np.vstack([resources.index.reconstruct(row) for row in rows])
+    picked = maximal_marginal_relevance(np.array(vector, dtype=np.float32), embeddings, lambda_mult=MMR_LAMBDA, k=limit)
+    return [docs[i] for i in picked]
+
+
 # ---------------------------
 # 3) Create summary + cards input (no hallucination)
 # ---------------------------
-def build_context_for_llm(docs: List[Document]) -> str:
+def format_price(md: Dict[str, Any]) -> str:
+    price_cr = md.get("price_in_cr")
+    price_rupee = md.get("price")
+    return f"₹{round(price_cr,2)} Cr" if price_cr else (f"₹{int(price_rupee)}" if price_rupee else "N/A")
+
+
+def format_variants(variants: Dict[str, Any]) -> str:
+    """e.g. "3 (2BHK, 3BHK; ₹0.85-1.4 Cr)" for a project collapsed by collapse_by_project."""
+    parts = [", ".join(variants.get("bhk") or [])]
+    low, high = variants.get("price_min"), variants.get("price_max")
+    if low and high:
+        parts.append(f"₹{round(low / 1e7, 2)}-{round(high / 1e7, 2)} Cr" if high > low else f"₹{round(low / 1e7, 2)} Cr")
+    details = "; ".join(p for p in parts if p)
+    return f"{variants['count']} ({details})" if details else str(variants["count"])
+
+
+def top_amenities(text: str, n: int = 3) -> List[str]:
+    """Pick up to n short amenity phrases out of the free-text aboutProperty field."""
+    parts = [p.strip() for p in re.split(r"[,;\n•|]|\.\s", text or "")]
+    return [p for p in parts if 2 < len(p) <= 40][:n]
+
+
+def build_cards(docs: List[Document], limit: int = 6) -> List[Dict[str, Any]]:
     """
-    Build a compact, plain text context from the retrieved docs.
-    We'll pass this to Groq LLM and instruct it to only use this data.
+    Build the property cards straight from Document metadata.
+    Cards are a pure reformatting of the records, so no LLM is involved.
     """
-    lines = []
-    for i, d in enumerate(docs, 1):
+    cards = []
+    for d in docs[:limit]:
         md = d.metadata or {}
         title = md.get("projectName") or md.get("slug") or "Unknown"
         locality = md.get("locality") or ""
         city = md.get("city") or ""
-        bhk = md.get("BHK") or md.get("bhk") or ""
-        price_cr = md.get("price_in_cr")
-        price_rupee = md.get("price")
-        price_str = (f"₹{round(price_cr,2)} Cr" if price_cr else (f"₹{int(price_rupee)}" if price_rupee else "N/A"))
-        status = md.get("status") or ""
-        amenities = md.get("amenities") or ""
-        possession = md.get("possessionDate") or ""
         slug = md.get("slug") or ""
+        cards.append({
+            "title": title,
+            "city_locality": ", ".join(x for x in (locality, city) if x),
+            "bhk": md.get("BHK") or md.get("bhk") or "",
+            "price": format_price(md),
+            "project_name": md.get("projectName") or "",
+            "possession_status": md.get("status") or "",
+            "top_amenities": top_amenities(md.get("amenities") or ""),
+            "cta_url": f"/project/{slug}",
+            "variants": format_variants(md["variants"]) if md.get("variants") else "",
+        })
+    return cards
 
-        lines.append(
-            f"ITEM_{i} || title: {title} || city: {city} || locality: {locality} || bhk: {bhk} || price: {price_str} || status: {status} || possession: {possession} || amenities: {amenities} || slug: {slug}"
-        )
-    return "\n".join(lines)
+
+# record fields dropped while the context is over budget, lowest value first
+CONTEXT_DROP_ORDER = ("amenities", "possession", "matching variants")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Tokens in `text` with the counter loaded by Resources.warmup. Nothing is loaded here
+    (this runs on the event loop); until warmup, or if the tokenizer is unavailable or
+    fails on this text, the fallback is ~chars/4, a rough estimate for Llama 3 on English.
+    """
+    counter = resources.token_counter
+    if counter is not None:
+        try:
+            return counter(text)
+        except Exception:
+            pass
+    return (len(text) + 3) // 4
+
+
+def _clip(value: Any, limit: int = CONTEXT_MAX_FIELD_CHARS) -> str:
+    text = " ".join(str(value or "").split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def context_fields(md: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """One record as (field, value) pairs: long fields clipped, amenities cut to a few phrases, empties left out."""
+    fields = [
+        ("title", md.get("projectName") or md.get("slug") or "Unknown"),
+        ("city", md.get("city")),
+        ("locality", md.get("locality")),
+        ("bhk", md.get("BHK") or md.get("bhk")),
+        ("price", format_price(md)),
+        ("status", md.get("status")),
+        ("possession", md.get("possessionDate")),
+        ("amenities", ", ".join(top_amenities(md.get("amenities") or "", CONTEXT_MAX_AMENITIES))),
+    ]
+    if md.get("variants"):
+        fields.append(("matching variants", format_variants(md["variants"])))
+    return [(name, _clip(value)) for name, value in fields if value]
+
+
+def render_context(records: List[List[Tuple[str, str]]], dropped: Tuple[str, ...] = ()) -> str:
+    return "\n".join(
+        f"ITEM_{i} || " + " || ".join(f"{name}: {value}" for name, value in fields if name not in dropped)
+        for i, fields in enumerate(records, 1)
+    )
+
+
+def budget_context(docs: List[Document], max_tokens: int = PROMPT_MAX_TOKENS) -> Tuple[str, Dict[str, Any]]:
+    """
+    Records text for the LLM within `max_tokens`: fields in CONTEXT_DROP_ORDER are
+    dropped first, then the lowest-ranked records (at least one record is always kept).
+    Returns the text and what was kept: {"records", "dropped_fields", "context_tokens"}.
+    """
+    records = [context_fields(d.metadata or {}) for d in docs]
+    dropped: Tuple[str, ...] = ()
+    text = render_context(records)
+    tokens = count_tokens(text)
+    for field in CONTEXT_DROP_ORDER:
+        if tokens <= max_tokens:
+            break
+        dropped += (field,)
+        text = render_context(records, dropped)
+        tokens = count_tokens(text)
+    while tokens > max_tokens and len(records) > 1:
+        records = records[:-1]
+        text = render_context(records, dropped)
+        tokens = count_tokens(text)
+    return text, {"records": len(records), "dropped_fields": list(dropped), "context_tokens": tokens}
+
+
+def build_context_for_llm(docs: List[Document]) -> str:
+    """
+    Build a compact, plain text context from the retrieved docs.
+    We'll pass this to Groq LLM and instruct it to only use this data.
+    """
+    return budget_context(docs)[0]
 
 
 # ---------------------------
 # 4) Prompt to Groq (strict, grounded)
 # ---------------------------
-from langchain.schema import HumanMessage
-import json, re
-
-def generate_summary_and_cards(user_query: str, records_text: str) -> dict:
-    SUMMARY_PROMPT = f"""
+# Cards are built deterministically by build_cards(); the LLM only writes the short summary.
+def build_summary_prompt(user_query: str, records_text: str) -> str:
+    return f"""
 You are an assistant for NoBrokerage.com. You will be given property records.
 **INSTRUCTIONS:**
 - Use ONLY the information in the provided records (do not hallucinate).
-- Produce a JSON object with two keys: "summary" and "cards".
-- "summary": 2-4 sentences summarizing matching properties, including price, BHK, readiness, localities, counts.
-- "cards": list of at most 6 objects with keys: title, city_locality, bhk, price, project_name, possession_status, top_amenities (list of 1-3 strings), cta_url.
-- If no records match, return:
-{{"summary":"No matching properties found. I expanded the search and found X alternatives.","cards":[]}}
+- Reply with 2-4 plain sentences (no JSON, no markdown) summarizing matching properties, including price, BHK, readiness, localities, counts.
+- If no records match, say so in one sentence.
 Records:
 {records_text}
 
@@ -242,81 +864,415 @@ User query:
 {user_query}
 """
 
-    # Call Groq LLM
-    resp = llm.generate([[HumanMessage(content=SUMMARY_PROMPT)]])
-    
-    # Extract text
+
+def summary_text(resp, user_query: str) -> str:
+    """Extract the summary text from an LLMResult."""
     try:
-        text = resp.generations[0][0].text
+        text = resp.generations[0][0].text.strip()
     except Exception:
-        text = str(resp)
+        text = ""
+    # Ensure summary fallback is strictly formatted
+    return text or f"No matching properties found for '{user_query}'."
 
-    # Parse JSON
-    try:
-        result_json = json.loads(text)
-    except json.JSONDecodeError:
-        # Attempt to extract JSON blob
-        match = re.search(r"(\{.*\})", text, re.S)
-        if match:
-            try:
-                result_json = json.loads(match.group(1))
-            except:
-                result_json = {"summary": "Error: Could not parse LLM output as JSON.", "cards": []}
-        else:
-            result_json = {"summary": "Error: Could not parse LLM output as JSON.", "cards": []}
 
-    # Ensure summary fallback is strictly formatted
-    if not result_json.get("summary"):
-        result_json["summary"] = f"No matching properties found for '{user_query}'."
+def prompt_stats(user_query: str, records_text: str, context: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-request prompt size report: the context budget outcome plus the whole prompt's tokens."""
+    return dict(context, prompt_tokens=count_tokens(build_summary_prompt(user_query, records_text)),
+                tokenizer=resources.tokenizer)
 
-    return result_json
 
+def template_summary(user_query: str, docs: List[Document], fallback: bool = False) -> str:
+    """
+    Deterministic summary straight from the records, used while the LLM is unavailable.
+    fallback=True: the records are unfiltered neighbours (nothing matched), worded as alternatives.
+    """
+    if not docs:
+        return f"No matching properties found for '{user_query}'."
+    parts = []
+    for d in docs[:3]:
+        md = d.metadata or {}
+        title = md.get("projectName") or md.get("slug") or "Unknown"
+        place = ", ".join(p for p in (md.get("locality"), md.get("city")) if p)
+        details = ", ".join(p for p in (md.get("BHK") or md.get("bhk"), format_price(md),
+                                         (md.get("status") or "").replace("_", " ").lower()) if p)
+        parts.append(f"{title}{f' in {place}' if place else ''} ({details})")
+    more = f", and {len(docs) - 3} more" if len(docs) > 3 else ""
+    found = f"{len(docs)} {'alternative' if fallback else 'matching project'}{'s' if len(docs) > 1 else ''}"
+    if fallback:
+        text = f"No matching properties found for '{user_query}'. I expanded the search and found {found}: {'; '.join(parts)}{more}."
+    else:
+        text = f"Found {found}: {'; '.join(parts)}{more}."
+    prices = [md["price_in_cr"] for md in (d.metadata or {} for d in docs) if md.get("price_in_cr")]
+    if len(prices) > 1:
+        text += f" Prices range from ₹{round(min(prices), 2)} Cr to ₹{round(max(prices), 2)} Cr."
+    return text
+
+
+def fallback_summary(user_query: str, docs: List[Document], fallback: bool = False) -> str:
+    llm_guard.count("fallbacks")
+    return template_summary(user_query, docs, fallback)
+
+
+def generate_summary(user_query: str, records_text: str) -> str:
+    """LLM summary through llm_guard; raises LLMUnavailable (callers fall back to template_summary)."""
+    prompt = build_summary_prompt(user_query, records_text)
+    # Call Groq LLM
+    resp = llm_guard.call(lambda: resources.llm.generate([[HumanMessage(content=prompt)]]))
+    return summary_text(resp, user_query)
+
+
+async def agenerate_summary(user_query: str, records_text: str) -> str:
+    """Same as generate_summary but awaits the LLM call instead of blocking."""
+    prompt = build_summary_prompt(user_query, records_text)
+    resp = await llm_guard.acall(lambda: resources.llm.agenerate([[HumanMessage(content=prompt)]]))
+    return summary_text(resp, user_query)
+
+
+async def astream_summary(user_query: str, records_text: str) -> AsyncIterator[str]:
+    """Yield summary tokens from the LLM as they arrive (LLMUnavailable if it fails or stalls)."""
+    prompt = build_summary_prompt(user_query, records_text)
+    async for chunk in llm_guard.astream(lambda: resources.llm.astream([HumanMessage(content=prompt)])):
+        if chunk.content:
+            yield chunk.content
 
 
 # ---------------------------
 # 5) Main handler
 # ---------------------------
+def finish_records(parsed: Dict[str, Any], vector: List[float], hits: List[Tuple[int, float]], k: int,
+                   limit: int = RESULT_LIMIT, fallback: bool = True) -> List[Document]:
+    """
+    Post-process one query's scored search hits: deterministic filter, fallback
+    to unfiltered neighbours (unless fallback=False), collapse by project, top `limit`.
+    """
+    # apply deterministic metadata filter on the row ids, before any Document is decoded
+    # (all True when the metadata index already pre-filtered)
+    if hits:
+        hits = [hit for hit, keep in zip(hits, filter_mask([row for row, _ in hits], parsed)) if keep]
+    if not hits and fallback:
+        # If none after filtering, expand search: use unfiltered neighbours as fallback
+        hits = search_rows_batch([vector], k=k, queries=[parsed.get("raw")], with_scores=True)[0]
+    if not hits:
+        return []
+
+    rows, docs = collapse_by_project([row for row, _ in hits], get_scored(hits))
+    return diversify(vector, rows, docs, limit)
+
+
+def retrieve_records(parsed: Dict[str, Any], vector: List[float], k: int = 12,
+                     limit: int = RESULT_LIMIT, fallback: bool = True) -> Tuple[List[Document], Dict[str, Any]]:
+    """
+    Pre-filtered vector search collapsed to distinct projects, falling back to the
+    unfiltered top hits. Returns the records and the retrieval telemetry
+    (see retrieve_records_batch).
+    """
+    return retrieve_records_batch([parsed], [vector], k=k, limit=limit, fallback=fallback)[0]
+
+
+def filter_signature(parsed: Dict[str, Any]) -> str:
+    return json.dumps({key: value for key, value in parsed.items() if key != "raw"}, sort_keys=True, default=str)
+
+
+def retrieve_records_batch(parsed_list: List[Dict[str, Any]], vectors: List[List[float]], k: int = 12,
+                           limit: int = RESULT_LIMIT, fallback: bool = True) -> List[Tuple[List[Document], Dict[str, Any]]]:
+    """
+    retrieve_records for many queries: queries with identical filters share one
+    metadata mask and one index.search over their stacked embeddings.
+    The first round fetches max(k, limit * DEDUP_OVERFETCH) hits. Queries left with fewer
+    than `limit` projects are searched again with k * OVERFETCH_GROWTH and, on IVF / HNSW
+    indexes, nprobe / efSearch scaled by the same factor per round, up to OVERFETCH_MAX_EFFORT
+    (a selective filter can leave the probed cells nearly empty while matching rows sit
+    elsewhere). This goes on until they have enough, every row allowed by the filters has
+    been returned, a search at the maximum effort returned fewer than k hits, or k and the
+    effort are both at their maximum; only then does a query fall back to unfiltered neighbours.
+    Up to log2(OVERFETCH_MAX_K) searches: async callers run this off the event loop.
+    Telemetry per query: rounds needed, final k, search effort, allowed rows, hits,
+    projects, fallback, took_ms.
+    """
+    started = time.perf_counter()
+    k = max(k, limit * DEDUP_OVERFETCH)
+    max_k = max(k, OVERFETCH_MAX_K)
+    max_effort = min(max_search_effort(resources.index), OVERFETCH_MAX_EFFORT)
+    masks: Dict[str, Optional[np.ndarray]] = {}
+    results: List[Optional[Tuple[List[Document], Dict[str, Any]]]] = [None] * len(parsed_list)
+    pending = list(range(len(parsed_list)))
+    rounds = 0
+    while pending:
+        rounds += 1
+        effort = min(OVERFETCH_GROWTH ** (rounds - 1), max_effort)
+        groups: Dict[str, List[int]] = {}
+        for n in pending:
+            groups.setdefault(filter_signature(parsed_list[n]), []).append(n)
+        pending = []
+        for signature, members in groups.items():
+            if signature not in masks:
+                masks[signature] = allowed_mask(parsed_list[members[0]])
+            mask = masks[signature]
+            allowed = int(mask.sum()) if mask is not None else resources.index.ntotal
+            found = search_rows_batch([vectors[n] for n in members], k=k, filters=parsed_list[members[0]],
+                                      queries=[parsed_list[n].get("raw") for n in members], with_scores=True,
+                                      mask=mask, effort=effort)
+            for n, hits in zip(members, found):
+                records = finish_records(parsed_list[n], vectors[n], hits, k, limit=limit, fallback=False)
+                exhausted = len(hits) >= allowed or (len(hits) < k and effort >= max_effort)
+                if len(records) < limit and not exhausted and (k < max_k or effort < max_effort):
+                    pending.append(n)
+                    continue
+                fell_back = fallback and not records
+                if fell_back:
+                    records = finish_records(parsed_list[n], vectors[n], [], k, limit=limit)
+                stats = {"rounds": rounds, "k": k, "effort": effort, "allowed": allowed, "hits": len(hits),
+                         "projects": len(records), "fallback": fell_back}
+                results[n] = (records, stats)
+        k = min(k * OVERFETCH_GROWTH, max_k)
+
+    took_ms = round((time.perf_counter() - started) * 1000, 2)
+    for _, stats in results:
+        stats["took_ms"] = took_ms
+    return results
+
+
+NO_RESULTS = {"summary": "No matching properties found and no alternatives available.", "cards": []}
+
+
+# ---------------------------
+# Response cache: same filters + same records + same prompt => same answer
+# ---------------------------
+# Only the summary is cached: the key ignores the query text and record order, so cards
+# (cheap and deterministic) are always rebuilt from the records this query retrieved.
+response_cache = LRUCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+
+
+def response_cache_key(parsed: Dict[str, Any], docs: List[Document]) -> str:
+    filters = {key: value for key, value in parsed.items() if key != "raw"}
+    doc_ids = sorted({str((d.metadata or {}).get("id") or (d.metadata or {}).get("slug")) for d in docs})
+    model = {"groq": GROQ_MODEL, "llamacpp": os.path.basename(LLAMACPP_MODEL_PATH or "")}.get(LLM_BACKEND)
+    payload = json.dumps([PROMPT_VERSION, resources.vectorstore_version, LLM_BACKEND, model, filters, doc_ids],
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_cached_response(key: str) -> Optional[Dict[str, Any]]:
+    result = response_cache.get(key)
+    disk_cache = resources.response_disk_cache
+    if result is None and disk_cache is not None:
+        result = disk_cache.get(key)
+        if result is not None:
+            response_cache.put(key, result)
+    return copy.deepcopy(result) if result is not None else None
+
+
+def store_response(key: str, result: Dict[str, Any]) -> None:
+    # don't pin empty or template (LLM unavailable) answers in the cache
+    if not (result.get("summary") or "").strip() or result.get("degraded"):
+        return
+    result = {"summary": result["summary"]}
+    response_cache.put(key, result)
+    disk_cache = resources.response_disk_cache
+    if disk_cache is not None:
+        disk_cache.put(key, result)
+
+
 def handle_query(query: str, k: int = 12) -> Dict[str, Any]:
     """
     Full pipeline:
     - parse query
     - semantic search (k)
     - deterministic filter
-    - pass filtered results to LLM for summary + cards (LLM is forced to use only these records)
+    - build cards from the filtered records; LLM writes only the summary (forced to use only these records)
     """
     parsed = parse_query(query)
-    sem_docs = semantic_search(query, k=k)
+    to_use, retrieval = retrieve_records(parsed, embed_query(query), k=k)
 
-    # apply deterministic metadata filter
-    filtered = apply_filters(sem_docs, parsed)
+    # If absolutely no documents at all:
+    if len(to_use) == 0:
+        return dict(NO_RESULTS, retrieval=retrieval)
+    if LLM_BACKEND == "template":
+        return {"summary": template_summary(query, to_use, retrieval["fallback"]), "cards": build_cards(to_use),
+                "retrieval": retrieval}
 
-    # If none after filtering, optionally expand search: use original sem_docs as fallback
-    to_use = filtered if filtered else sem_docs[:6]  # keep up to 6 for LLM context
+    cache_key = response_cache_key(parsed, to_use)
+    cached = get_cached_response(cache_key)
+    if cached is not None:
+        return {"summary": cached["summary"], "cards": build_cards(to_use), "retrieval": retrieval}
 
-    # Build plain records text for LLM
-    records_text = build_context_for_llm(to_use)
+    # Build plain records text for LLM, within the prompt token budget
+    records_text, context = budget_context(to_use)
+    try:
+        result = {"summary": generate_summary(query, records_text), "cards": build_cards(to_use)}
+    except LLMUnavailable:
+        result = {"summary": fallback_summary(query, to_use, retrieval["fallback"]), "cards": build_cards(to_use),
+                  "degraded": True}
+    store_response(cache_key, result)
+    return dict(result, retrieval=retrieval, prompt=prompt_stats(query, records_text, context))
+
+
+async def answer_records(query: str, parsed: Dict[str, Any], to_use: List[Document],
+                         fallback: bool = False) -> Dict[str, Any]:
+    """
+    Summary + cards for already retrieved records (response cache first, then the LLM).
+    fallback: the records are unfiltered neighbours (retrieval["fallback"]).
+    """
+    if len(to_use) == 0:
+        return dict(NO_RESULTS)
+    if LLM_BACKEND == "template":
+        return {"summary": template_summary(query, to_use, fallback), "cards": build_cards(to_use)}
+
+    cache_key = response_cache_key(parsed, to_use)
+    cached = get_cached_response(cache_key)
+    if cached is not None:
+        return {"summary": cached["summary"], "cards": build_cards(to_use)}
+
+    records_text, context = budget_context(to_use)
+    try:
+        result = {"summary": await agenerate_summary(query, records_text), "cards": build_cards(to_use)}
+    except LLMUnavailable:
+        result = {"summary": fallback_summary(query, to_use, fallback), "cards": build_cards(to_use), "degraded": True}
+    store_response(cache_key, result)
+    return dict(result, prompt=prompt_stats(query, records_text, context))
+
+
+async def ahandle_query(query: str, k: int = 12) -> Dict[str, Any]:
+    """
+    Async pipeline used by the API: identical steps to handle_query, but the
+    embedding runs on an executor and the Groq call is awaited, so a single
+    worker can keep many LLM round trips in flight.
+    """
+    parsed = parse_query(query)
+    vector = await aembed_query(query)
+    # the adaptive over-fetch can take several FAISS searches: keep it off the event loop
+    to_use, retrieval = await asyncio.to_thread(retrieve_records, parsed, vector, k)
+    return dict(await answer_records(query, parsed, to_use, retrieval["fallback"]), retrieval=retrieval)
+
+
+async def ahandle_batch(queries: List[str], k: int = 12, concurrency: int = BATCH_LLM_CONCURRENCY) -> List[Dict[str, Any]]:
+    """
+    Batch pipeline: one embedding pass for all queries, one index.search per
+    distinct filter set, then the Groq calls run concurrently (at most
+    `concurrency` in flight). Results come back in query order; a failed item
+    carries an "error" instead of failing the whole batch.
+    """
+    parsed_list = [parse_query(q) for q in queries]
+    loop = asyncio.get_running_loop()
+    vectors = await loop.run_in_executor(_embed_executor, embed_queries, queries)
+    records = await asyncio.to_thread(retrieve_records_batch, parsed_list, vectors, k)
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def answer(query: str, parsed: Dict[str, Any], to_use: List[Document], retrieval: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                result = await answer_records(query, parsed, to_use, retrieval["fallback"])
+            except Exception as e:
+                result = {"summary": None, "cards": build_cards(to_use), "error": f"{type(e).__name__}: {e}"}
+            return dict(result, retrieval=retrieval)
+
+    return await asyncio.gather(*(answer(q, p, *r) for q, p, r in zip(queries, parsed_list, records)))
+
+
+async def astream_query(query: str, k: int = 12) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Streaming pipeline: yields ("cards", [...]) as soon as retrieval and filtering
+    are done, then ("token", "...") for every summary chunk, then ("done", {...}).
+    """
+    parsed = parse_query(query)
+    vector = await aembed_query(query)
+    # the adaptive over-fetch can take several FAISS searches: keep it off the event loop
+    to_use, retrieval = await asyncio.to_thread(retrieve_records, parsed, vector, k)
 
-    # If absolutely no documents at all:
     if len(to_use) == 0:
-        return {"summary": "No matching properties found and no alternatives available.", "cards": []}
+        yield "cards", []
+        yield "token", NO_RESULTS["summary"]
+        yield "done", {"count": 0, "retrieval": retrieval}
+        return
+
+    cards = build_cards(to_use)
+    yield "cards", cards
+
+    if LLM_BACKEND == "template":
+        yield "token", template_summary(query, to_use, retrieval["fallback"])
+        yield "done", {"count": len(to_use), "retrieval": retrieval}
+        return
+
+    cache_key = response_cache_key(parsed, to_use)
+    cached = get_cached_response(cache_key)
+    if cached is not None:
+        yield "token", cached["summary"]
+        yield "done", {"count": len(to_use), "cached": True, "retrieval": retrieval}
+        return
+
+    records_text, context = budget_context(to_use)
+    tokens = []
+    degraded = False
+    try:
+        async for token in astream_summary(query, records_text):
+            tokens.append(token)
+            yield "token", token
+    except LLMUnavailable:
+        # before the first token: answer from the template; mid-stream: end with what was sent
+        degraded = True
+        if not tokens:
+            yield "token", fallback_summary(query, to_use, retrieval["fallback"])
+    if not degraded:
+        store_response(cache_key, {"summary": "".join(tokens)})
+    yield "done", {"count": len(to_use), "retrieval": retrieval, "prompt": prompt_stats(query, records_text, context),
+                   "degraded": degraded}
+
+
+# ---------------------------
+# 6) Retrieval-only search (no LLM)
+# ---------------------------
+def search_page(parsed: Dict[str, Any], vector: List[float], page: int = 1, page_size: int = 10,
+                fallback: bool = False) -> Dict[str, Any]:
+    """
+    One page of ranked, filtered projects with scores, for listing pages / autocomplete.
+    Same retrieval as the chat pipeline (pre-filter, BM25 fusion, project collapse),
+    but no unfiltered fallback unless asked for, and no Groq call.
+    """
+    started = time.perf_counter()
+    depth = min(page * page_size, SEARCH_MAX_RESULTS)
+    # one extra project tells whether there is a next page
+    docs, retrieval = retrieve_records(parsed, vector, limit=depth + 1, fallback=fallback)
+
+    start = (page - 1) * page_size
+    page_docs = docs[start:min(start + page_size, depth)]
+    cards = build_cards(page_docs, limit=len(page_docs))
+    metadata_index = resources.metadata_index
+    matching = None
+    if metadata_index is not None:
+        mask = metadata_index.mask(parsed)
+        matching = int(mask.sum()) if mask is not None else len(metadata_index)
+    return {
+        "query": parsed.get("raw"),
+        "filters": {key: value for key, value in parsed.items() if key != "raw"},
+        "page": page,
+        "page_size": page_size,
+        "has_more": len(docs) > start + page_size and start + page_size < SEARCH_MAX_RESULTS,
+        "matching_listings": matching,
+        "results": [
+            dict(card, id=doc.metadata.get("id"), score=doc.metadata.get("score"))
+            for card, doc in zip(cards, page_docs)
+        ],
+        "retrieval": retrieval,
+        "took_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def search_listings(query: str, page: int = 1, page_size: int = 10, fallback: bool = False) -> Dict[str, Any]:
+    return search_page(parse_query(query), embed_query(query), page=page, page_size=page_size, fallback=fallback)
 
-    llm_result = generate_summary_and_cards(query, records_text)
 
-    # Ensure cards also include CTA built from slug if missing formatting
-    cards = llm_result.get("cards", [])
-    for c, doc in zip(cards, to_use):
-        # ensure cta_url exists
-        if not c.get("cta_url") or c.get("cta_url") == "":
-            slug = doc.metadata.get("slug") or ""
-            c["cta_url"] = f"/project/{slug}"
-    return llm_result
+async def asearch_listings(query: str, page: int = 1, page_size: int = 10, fallback: bool = False) -> Dict[str, Any]:
+    """Async variant: the embedding and the retrieval (adaptive over-fetch) run off the event loop."""
+    vector = await aembed_query(query)
+    return await asyncio.to_thread(search_page, parse_query(query), vector, page, page_size, fallback)
 
 
 # ---------------------------
 # CLI interactive usage
 # ---------------------------
 if __name__ == "__main__":
-    print("NoBrokerage Chatbot (Groq) — demo (grounded summary + cards).")
+    print(f"NoBrokerage Chatbot ({LLM_BACKEND}) — demo (grounded summary + cards).")
     print("Type 'exit' to quit.")
     while True:
         q = input("\nEnter user query: ").strip()
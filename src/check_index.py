@@ -1,21 +1,31 @@
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
+import os
+import faiss
+from src.metadata_store import MetadataStore
+from src.metadata_index import MetadataIndex
 
-# Path of  vectorstore
-DB_FAISS_PATH = "../vectorStore"
+# Path of  vectorstore (run as `python -m src.check_index` from the project root)
+DB_FAISS_PATH = os.getenv("VECTORSTORE_DIR", "vectorStore")
 
 def check_faiss_index():
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    db = FAISS.load_local(DB_FAISS_PATH, embeddings, allow_dangerous_deserialization=True)
+    index = faiss.read_index(os.path.join(DB_FAISS_PATH, "index.faiss"))
 
     # Number of vectors stored in index.faiss
-    num_vectors = db.index.ntotal
+    num_vectors = index.ntotal
 
-    # Number of documents (with metadata) stored in index.pkl
-    num_docs = len(db.docstore._dict)
+    # Number of documents (with metadata) stored in the columnar metadata store
+    num_docs = len(MetadataStore(os.path.join(DB_FAISS_PATH, "store")))
 
     print(f"📦 index.faiss contains {num_vectors} vectors")
-    print(f"📑 index.pkl contains {num_docs} metadata entries")
+    print(f"📑 store/ contains {num_docs} metadata entries")
+
+    # Rows retired by incremental ingest stay in the index until the next full ingest
+    meta_dir = os.path.join(DB_FAISS_PATH, "meta")
+    if os.path.isdir(meta_dir):
+        live = MetadataIndex.load(meta_dir).live
+        num_live = int(live.sum())
+        print(f"✅ {num_live} live listings, {len(live) - num_live} tombstoned rows")
+    else:
+        print(f"✅ {num_docs} live listings (no meta/live.npy: nothing tombstoned)")
 
 if __name__ == "__main__":
     check_faiss_index()
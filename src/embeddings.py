@@ -0,0 +1,129 @@
+# embeddings.py
+import os
+import time
+from typing import List, Optional
+
+import numpy as np
+from langchain_huggingface import HuggingFaceEmbeddings
+from src.cache import EmbeddingCache
+
+# ---------------------------
+# Embedding model (shared by ingest.py and chatbot.py)
+# ---------------------------
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# Texts per forward pass
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# Ingest only: worker processes (0/1 = embed in-process with TORCH_THREADS intra-op threads)
+EMBED_PROCESSES = int(os.getenv("EMBED_PROCESSES", "0"))
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", "0"))  # 0 = one per core
+# "" (fp32) | fp16 | int8 (dynamic quantization of the Linear layers, CPU)
+EMBED_QUANTIZE = os.getenv("EMBED_QUANTIZE", "")
+QUANTIZE_MODES = ("", "fp16", "int8")
+# Ingest only: on-disk cache of document vectors keyed by content hash ("" disables).
+# Kept outside vectorStore/ so it is not shipped in the Docker image.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", os.path.join(PROJECT_ROOT, "embeddingCache", "embeddings.sqlite"))
+
+
+def load_embeddings(model_name: str = EMBEDDING_MODEL, quantize: str = EMBED_QUANTIZE,
+                    batch_size: int = EMBED_BATCH_SIZE) -> HuggingFaceEmbeddings:
+    """
+    MiniLM wrapped for LangChain, optionally quantized.
+    Queries must be embedded with the same quantization as the index (see index_config.json).
+    """
+    if quantize not in QUANTIZE_MODES:
+        raise ValueError(f"Unknown EMBED_QUANTIZE {quantize!r}; expected one of {QUANTIZE_MODES}")
+    embeddings = HuggingFaceEmbeddings(model_name=model_name, encode_kwargs={"batch_size": batch_size})
+    if quantize:
+        import torch
+
+        model = embeddings._client  # the underlying SentenceTransformer
+        if quantize == "int8":
+            torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        else:
+            model.half()
+    return embeddings
+
+
+class BatchEmbedder:
+    """
+    Ingest-side embedding: explicit torch thread count, optional pool of worker
+    processes kept alive for the whole run, a content-hash cache consulted before
+    the model, and a running texts/sec figure.
+    """
+
+    def __init__(self, processes: int = EMBED_PROCESSES, threads: int = TORCH_THREADS,
+                 quantize: str = EMBED_QUANTIZE, batch_size: int = EMBED_BATCH_SIZE,
+                 cache_path: str = EMBED_CACHE_PATH, model_name: str = EMBEDDING_MODEL):
+        import torch
+
+        cores = os.cpu_count() or 1
+        self.processes = processes if processes > 1 else 1
+        self.threads = threads or max(1, cores // self.processes)
+        if self.processes > 1:
+            # spawned workers read this when importing torch; one share of the cores each
+            # instead of every worker starting one thread per core
+            os.environ["OMP_NUM_THREADS"] = str(self.threads)
+        torch.set_num_threads(self.threads)
+
+        self.model_name = model_name
+        self.quantize = quantize
+        self.batch_size = batch_size
+        self.embeddings = load_embeddings(model_name=model_name, quantize=quantize, batch_size=batch_size)
+        self.model = self.embeddings._client
+        self.pool: Optional[dict] = None
+        if self.processes > 1:
+            self.pool = self.model.start_multi_process_pool(["cpu"] * self.processes)
+        self.cache: Optional[EmbeddingCache] = None
+        if cache_path:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            self.cache = EmbeddingCache(cache_path, namespace=f"{model_name}|{quantize or 'fp32'}")
+        self.texts = 0
+        self.seconds = 0.0
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        if self.pool is not None:
+            # same preprocessing as HuggingFaceEmbeddings.embed_documents
+            texts = [t.replace("\n", " ") for t in texts]
+            vectors = self.model.encode_multi_process(texts, self.pool, batch_size=self.batch_size)
+        else:
+            vectors = self.embeddings.embed_documents(texts)
+        return np.asarray(vectors, dtype=np.float32)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        start = time.perf_counter()
+        if not texts:
+            return np.empty((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        if self.cache is None:
+            vectors = self._encode(texts)
+        else:
+            cached = self.cache.get_many(texts)
+            missing = [i for i, v in enumerate(cached) if v is None]
+            if missing:
+                fresh = self._encode([texts[i] for i in missing])
+                self.cache.put_many([texts[i] for i in missing], fresh)
+                for i, vector in zip(missing, fresh):
+                    cached[i] = vector
+            vectors = np.stack(cached)
+        self.texts += len(texts)
+        self.seconds += time.perf_counter() - start
+        return vectors
+
+    @property
+    def rate(self) -> float:
+        """Texts embedded per second so far."""
+        return self.texts / self.seconds if self.seconds else 0.0
+
+    def describe(self) -> str:
+        mode = f"{self.processes} processes" if self.pool is not None else "in-process"
+        cache = f"cache {self.cache.path}" if self.cache is not None else "no cache"
+        return f"{mode}, {self.threads} torch threads, batch {self.batch_size}, {self.quantize or 'fp32'}, {cache}"
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.model.stop_multi_process_pool(self.pool)
+            self.pool = None
+        if self.cache is not None:
+            print(f"Embedding cache: {self.cache.stats()}")
+            self.cache.close()
+            self.cache = None
@@ -1,12 +1,20 @@
 import os
+import json
+import time
+import argparse
 import pymongo
-import pickle
+import faiss
+import numpy as np
 from dotenv import load_dotenv
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from src.embeddings import EMBEDDING_MODEL, EMBED_QUANTIZE, BatchEmbedder
+from src.keyword_index import KeywordIndex
+from src.metadata_index import MetadataIndex, MetadataIndexWriter
+from src.metadata_store import MetadataStore, MetadataStoreWriter
+from src.query_parser import build_dictionary, save_dictionary
+from src.vector_index import build_index, load_index_config, recall_report, save_index_config, write_index_atomic
 
 # -----------------------------
 # 1. Load environment variables
@@ -15,9 +23,38 @@ load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI")  # Mongo connection
 DB_NAME = os.getenv("DB_NAME", "company_chatbot")
 COLLECTION_NAME = os.getenv("COLLECTION_NAME", "processed_data")
-VECTORSTORE_DIR = "../vectorstore"
+# Same location chatbot.py loads from (run as `python -m src.ingest` from the project root)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VECTORSTORE_DIR = os.getenv("VECTORSTORE_DIR", os.path.join(PROJECT_ROOT, "vectorStore"))
 os.makedirs(VECTORSTORE_DIR, exist_ok=True)
 
+# Index type: flat (exact) | hnsw | ivf_flat | ivf_pq — see src/vector_index.py
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")
+INDEX_PARAMS = {
+    "hnsw_m": os.getenv("HNSW_M"),
+    "ef_construction": os.getenv("HNSW_EF_CONSTRUCTION"),
+    "ef_search": os.getenv("HNSW_EF_SEARCH"),
+    "nlist": os.getenv("IVF_NLIST"),
+    "nprobe": os.getenv("IVF_NPROBE"),
+    "pq_m": os.getenv("PQ_M"),
+    "pq_nbits": os.getenv("PQ_NBITS"),
+}
+# Print recall@k / latency of the approximate index against exact search
+INDEX_REPORT = os.getenv("INDEX_REPORT", "1") == "1"
+# Mongo documents per pipeline batch (fetch → preprocess → embed → write);
+# peak memory is set by this, not by the collection size
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+# Characters of aboutProperty kept in the embedded text. MiniLM only reads the first
+# 256 word pieces anyway; the full text stays in the `amenities` metadata for cards.
+ABOUT_MAX_CHARS = int(os.getenv("ABOUT_MAX_CHARS", "600"))
+
+INDEX_PATH = os.path.join(VECTORSTORE_DIR, "index.faiss")
+STORE_DIR = os.path.join(VECTORSTORE_DIR, "store")
+META_DIR = os.path.join(VECTORSTORE_DIR, "meta")
+KEYWORDS_DIR = os.path.join(VECTORSTORE_DIR, "keywords")
+# updatedAt watermark + build version of the last successful run
+STATE_PATH = os.path.join(VECTORSTORE_DIR, "ingest_state.json")
+
 # -----------------------------
 # 2. Connect to MongoDB
 # -----------------------------
@@ -39,6 +76,11 @@ def clean_numeric(val):
     except:
         return None
 
+def truncate_words(text, limit):
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] + " …"
+
 def preprocess_document(doc):
     """Convert MongoDB doc to LangChain Document with full structured metadata"""
     project_name = clean_string(doc.get("projectName"))
@@ -75,7 +117,7 @@ def preprocess_document(doc):
     Lift: {lift}
     Location: {locality}, {city}
     Address: {address}
-    Amenities: {amenities}
+    Amenities: {truncate_words(amenities, ABOUT_MAX_CHARS)}
     """
 
     # Structured metadata
@@ -107,29 +149,244 @@ def preprocess_document(doc):
 
 
 # -----------------------------
-# 4. Fetch & preprocess all docs
+# 4. Chunking, embedding & ingest state helpers
 # -----------------------------
-raw_docs = list(collection.find({}))
-documents = [preprocess_document(doc) for doc in raw_docs]
-print(f"Fetched {len(documents)} documents from MongoDB")
+# One Document (and one vector) per listing variant: listings are short, and splitting
+# a long aboutProperty made one property take several top-k slots.
+# The embedding model is loaded inside full_ingest / incremental_ingest (src/embeddings.py),
+# not at import time: EMBED_PROCESSES workers are spawned and re-import this module.
+def to_documents(raw_docs) -> List[Document]:
+    return [preprocess_document(doc) for doc in raw_docs]
+
+
+def embed(embedder: BatchEmbedder, docs: List[Document]) -> np.ndarray:
+    return embedder.embed([d.page_content for d in docs])
+
+
+def iter_batches(cursor: Iterable[Dict[str, Any]], size: int = INGEST_BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """Group a Mongo cursor into lists of `size` documents without reading ahead."""
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def max_updated_at(raw_docs, current: Any = None) -> Any:
+    values = [d.get("updatedAt") for d in raw_docs if d.get("updatedAt") is not None]
+    if current is not None:
+        values.append(current)
+    try:
+        return max(values) if values else None
+    except TypeError:  # mixed datetime / string values
+        return max(values, key=str)
+
+
+def load_state() -> Optional[Dict[str, Any]]:
+    if not os.path.exists(STATE_PATH):
+        return None
+    with open(STATE_PATH, encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("watermark_type") == "datetime":
+        state["watermark"] = datetime.fromisoformat(state["watermark"])
+    return state
+
+
+def save_state(watermark: Any) -> None:
+    """Record the watermark; `version` changes on every write so servers drop cached answers."""
+    state = {
+        "watermark": watermark.isoformat() if isinstance(watermark, datetime) else watermark,
+        "watermark_type": "datetime" if isinstance(watermark, datetime) else "raw",
+        "version": f"{time.time():.6f}",
+        "updated": datetime.now().isoformat(timespec="seconds"),
+    }
+    with open(STATE_PATH + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, default=str)
+    os.replace(STATE_PATH + ".tmp", STATE_PATH)
 
-# -----------------------------
-# 5. Chunk documents
-# -----------------------------
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=512, chunk_overlap=50)
-docs = text_splitter.split_documents(documents)
-print(f"After chunking → {len(docs)} chunks")
 
 # -----------------------------
-# 6. Generate embeddings
+# 5. Full rebuild (streaming)
 # -----------------------------
-embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-vectorstore = FAISS.from_documents(docs, embedding_model)
+# Documents flow through in INGEST_BATCH_SIZE batches: each batch is preprocessed and
+# embedded, its vectors are appended to a scratch file on disk and its rows to the
+# metadata store / index writers, then it is dropped. The index is built from the
+# memory-mapped scratch file (training samples it, vectors are added in slices), so
+# memory holds one batch plus the index itself, never the whole collection.
+def full_ingest():
+    spill_path = os.path.join(VECTORSTORE_DIR, "vectors.f32.tmp")
+    store_writer = MetadataStoreWriter(STORE_DIR)
+    meta_writer = MetadataIndexWriter()
+    watermark, n_docs, dim = None, 0, None
+    started = time.perf_counter()
+    embedder = BatchEmbedder()
+    print(f"Embedding with {embedder.model_name} ({embedder.describe()})")
+
+    with open(spill_path, "wb") as spill:
+        for raw_docs in iter_batches(collection.find({}, batch_size=INGEST_BATCH_SIZE)):
+            docs = to_documents(raw_docs)
+            vectors = embed(embedder, docs)
+            dim = vectors.shape[1] if len(docs) else dim
+            spill.write(vectors.tobytes())
+            # Columnar metadata store (row i == FAISS vector i); replaces the pickled docstore (index.pkl)
+            store_writer.add_documents(docs)
+            # Used by chatbot.py to pre-filter on city / BHK / price / status / locality before vector search
+            meta_writer.add_documents(docs)
+            watermark = max_updated_at(raw_docs, watermark)
+            n_docs += len(raw_docs)
+            elapsed = time.perf_counter() - started
+            print(f"  {n_docs} documents ({elapsed:.0f}s, {n_docs / elapsed:.1f} docs/s, "
+                  f"embedding {embedder.rate:.1f} docs/s)")
+    embedder.close()
+
+    if not len(meta_writer):
+        os.remove(spill_path)
+        store_writer.abort()
+        print("⚠️ No documents found in MongoDB; nothing to index.")
+        return
+    print(f"Fetched {n_docs} documents from MongoDB")
+
+    vectors = np.memmap(spill_path, dtype=np.float32, mode="r", shape=(len(meta_writer), dim))
+    try:
+        index, index_config = build_index(vectors, INDEX_TYPE, **INDEX_PARAMS)
+        # chatbot.py embeds queries with the same model / quantization
+        index_config["embedding"] = {"model": embedder.model_name, "quantize": embedder.quantize}
+        print(f"Built {index_config['type']} index: {index_config}")
+        if INDEX_REPORT and index_config["type"] != "flat":
+            index_config["report"] = recall_report(index, vectors)
+            print(f"📊 Recall vs flat baseline: {index_config['report']}")
+    finally:
+        del vectors
+        os.remove(spill_path)
+
+    store_writer.close()
+    legacy_pickle = os.path.join(VECTORSTORE_DIR, "index.pkl")
+    if os.path.exists(legacy_pickle):
+        os.remove(legacy_pickle)
+    meta_writer.build().save(META_DIR)
+    # BM25 over project / locality names, fused with FAISS results in chatbot.py,
+    # and the city / locality / project dictionary of the query parser
+    store = MetadataStore(STORE_DIR)
+    KeywordIndex.from_store(store).save(KEYWORDS_DIR)
+    save_dictionary(VECTORSTORE_DIR, build_dictionary(store))
+
+    save_index_config(VECTORSTORE_DIR, index_config)
+    write_index_atomic(index, INDEX_PATH)
+    save_state(watermark)
+    print(f"✅ FAISS vectors, metadata store and metadata index ({index.ntotal} rows) saved in {VECTORSTORE_DIR}")
+
 
 # -----------------------------
-# 7. Save FAISS index & metadata separately
+# 6. Incremental refresh (updatedAt watermark)
 # -----------------------------
-# Save FAISS vectorstore (index + metadata) into the folder
-vectorstore.save_local(VECTORSTORE_DIR)
-print(f"✅ FAISS vectors and metadata saved in {VECTORSTORE_DIR}")
+# Rows are never rewritten in place: new/changed listings are embedded and appended
+# (row i == FAISS id i still holds), and the rows they supersede, plus rows of
+# listings deleted from Mongo, are tombstoned in the metadata index's `live` column,
+# which chatbot.py always applies as an IDSelector. Tombstones cost index space
+# only; run a full rebuild when the dead fraction gets large.
+def iter_changed_batches(new_ids: List[Any], watermark) -> Iterator[List[Dict[str, Any]]]:
+    """Batches of listings updated since `watermark`, then of `new_ids` not already seen.
+    New ids are looked up INGEST_BATCH_SIZE at a time: one $in over all of them can
+    exceed Mongo's 16 MB query size on a first run against a large collection."""
+    seen = set()
+    if watermark is not None:
+        for raw_docs in iter_batches(collection.find({"updatedAt": {"$gt": watermark}}, batch_size=INGEST_BATCH_SIZE)):
+            seen.update(d["_id"] for d in raw_docs)
+            yield raw_docs
+    new_ids = [i for i in new_ids if i not in seen]
+    for start in range(0, len(new_ids), INGEST_BATCH_SIZE):
+        raw_docs = list(collection.find({"_id": {"$in": new_ids[start:start + INGEST_BATCH_SIZE]}}))
+        if raw_docs:
+            yield raw_docs
+
+
+def incremental_ingest():
+    state = load_state()
+    if state is None or not all(os.path.exists(p) for p in (INDEX_PATH, STORE_DIR, META_DIR)):
+        print("No previous build found; running a full ingest.")
+        return full_ingest()
+    watermark = state.get("watermark")
+
+    metadata_index = MetadataIndex.load(META_DIR)
+    rows_by_id: Dict[str, List[int]] = {}
+    for row, (doc_id, alive) in enumerate(zip(MetadataStore(STORE_DIR).column("id"), metadata_index.live)):
+        if alive:
+            rows_by_id.setdefault(doc_id, []).append(row)
+
+    # ids only: cheap even for large collections
+    current_ids = {str(d["_id"]): d["_id"] for d in collection.find({}, {"_id": 1}, batch_size=INGEST_BATCH_SIZE)}
+    deleted = set(rows_by_id) - set(current_ids)
+    new_ids = [current_ids[i] for i in set(current_ids) - set(rows_by_id)]
+
+    # Same batch pipeline as the full build, appending to the existing files.
+    # New vectors must match the existing ones, so the index's model and quantization win over
+    # EMBEDDING_MODEL / EMBED_QUANTIZE.
+    built_with = load_index_config(VECTORSTORE_DIR).get("embedding", {})
+    model_name = built_with.get("model", EMBEDDING_MODEL)
+    quantize = built_with.get("quantize", EMBED_QUANTIZE)
+    if model_name != EMBEDDING_MODEL:
+        print(f"⚠️ EMBEDDING_MODEL is {EMBEDDING_MODEL} but the index was built with {model_name}; using {model_name}.")
+    index = store_writer = meta_writer = embedder = None
+    changed_ids, new_watermark = set(), watermark
+    for raw_docs in iter_changed_batches(new_ids, watermark):
+        changed_ids.update(str(d["_id"]) for d in raw_docs)
+        new_watermark = max_updated_at(raw_docs, new_watermark)
+        docs = to_documents(raw_docs)
+        if not docs:
+            continue
+        if index is None:
+            index = faiss.read_index(INDEX_PATH)
+            embedder = BatchEmbedder(quantize=quantize, model_name=model_name)
+            store_writer = MetadataStoreWriter(STORE_DIR, append=True)
+            meta_writer = MetadataIndexWriter(metadata_index)
+        index.add(embed(embedder, docs))
+        store_writer.add_documents(docs)
+        meta_writer.add_documents(docs)
+    if embedder is not None:
+        embedder.close()
+
+    stale_rows = [row for doc_id in deleted | changed_ids for row in rows_by_id.get(doc_id, [])]
+    print(f"Incremental: {len(changed_ids)} new/changed, {len(deleted)} deleted, {len(stale_rows)} rows to retire")
+
+    if not changed_ids and not stale_rows:
+        print("✅ Vectorstore already up to date.")
+        return
+
+    appended = 0
+    if index is not None:
+        store_writer.close()
+        appended = len(meta_writer) - len(metadata_index)
+        metadata_index = meta_writer.build()
+        # names only, so rebuilding is cheap; rows that are only tombstoned need no change
+        store = MetadataStore(STORE_DIR)
+        KeywordIndex.from_store(store).save(KEYWORDS_DIR)
+        save_dictionary(VECTORSTORE_DIR, build_dictionary(store))
+    if stale_rows:
+        metadata_index.tombstone(stale_rows)
+    metadata_index.save(META_DIR)
+    if index is not None:
+        write_index_atomic(index, INDEX_PATH)
+    save_state(new_watermark)
+
+    dead = 1 - float(np.mean(metadata_index.live))
+    print(f"✅ Appended {appended} listings; {len(metadata_index)} rows, {dead:.1%} tombstoned")
+    if dead > 0.3:
+        print("⚠️ More than 30% of the index is tombstoned; consider a full rebuild.")
+
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or refresh the FAISS vectorstore from MongoDB.")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=os.getenv("INGEST_MODE") == "incremental",
+        help="only embed documents changed since the last run (INGEST_MODE=incremental)",
+    )
+    args = parser.parse_args()
+    if args.incremental:
+        incremental_ingest()
+    else:
+        full_ingest()
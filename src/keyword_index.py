@@ -0,0 +1,159 @@
+# keyword_index.py
+import os
+import re
+import json
+import math
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from src.metadata_store import MetadataStore, save_npy_atomic, save_json_atomic
+
+# ---------------------------
+# BM25 inverted index over listing names
+# ---------------------------
+# MiniLM is weak on proper nouns ("Ashwini in Chembur"), so exact project / locality
+# names are looked up here and fused with the FAISS ranking (reciprocal rank fusion).
+# Postings are stored CSR-style, one row per FAISS vector (row i == FAISS id i):
+#   terms.json   term list; term id = position
+#   indptr.npy   int64, postings of term t are rows[indptr[t]:indptr[t+1]]
+#   rows.npy     int32 row ids      tf.npy   uint16 term frequencies
+#   doc_len.npy  uint16 tokens per row
+#   project_df.npy  int32 distinct projects per term (variants of one project are separate
+#                rows, so document frequency is counted per project, not per row)
+
+FIELDS = ("projectName", "locality", "slug", "address")
+K1 = 1.2
+B = 0.75
+# terms found in this many projects or fewer are always scored, whatever max_df (small catalogues)
+MIN_SKIPPED_DF = 3
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall((text or "").lower())
+
+
+def project_of(store: MetadataStore, row: int) -> str:
+    """Variants of one project share a slug (projectName / id as fallbacks), as in chatbot.project_key."""
+    for field in ("slug", "projectName", "id"):
+        value = store.string(row, field).strip().lower()
+        if value:
+            return value
+    return f"row:{row}"
+
+
+class KeywordIndex:
+    def __init__(self, terms: List[str], indptr: np.ndarray, rows: np.ndarray, tf: np.ndarray, doc_len: np.ndarray,
+                 project_df: Optional[np.ndarray] = None, n_projects: Optional[int] = None):
+        self.term_ids: Dict[str, int] = {t: i for i, t in enumerate(terms)}
+        self.indptr = indptr
+        self.rows = rows
+        self.tf = tf
+        self.doc_len = doc_len
+        self.avgdl = float(doc_len.mean()) if len(doc_len) else 1.0
+        # indexes built before project_df existed count rows instead
+        self.project_df = project_df if project_df is not None else np.diff(indptr)
+        self.n_projects = n_projects if n_projects is not None else len(doc_len)
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    # ---------- build / persist ----------
+    @classmethod
+    def from_store(cls, store: MetadataStore) -> "KeywordIndex":
+        """Index FIELDS of every row (tombstoned rows too; they are masked out at query time)."""
+        postings: Dict[str, tuple] = {}
+        doc_len = array("H")
+        project_ids: Dict[str, int] = {}
+        project = np.empty(store.rows, dtype=np.int32)
+        for row in range(store.rows):
+            project[row] = project_ids.setdefault(project_of(store, row), len(project_ids))
+            counts: Dict[str, int] = {}
+            for field in FIELDS:
+                for token in tokenize(store.string(row, field)):
+                    counts[token] = counts.get(token, 0) + 1
+            doc_len.append(min(sum(counts.values()), 65535))
+            for token, count in counts.items():
+                rows, tf = postings.setdefault(token, (array("i"), array("H")))
+                rows.append(row)
+                tf.append(min(count, 65535))
+
+        terms = sorted(postings)
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(postings[t][0]) for t in terms])
+        rows = np.concatenate([np.frombuffer(postings[t][0], dtype=np.int32) for t in terms]) if terms else np.empty(0, np.int32)
+        tf = np.concatenate([np.frombuffer(postings[t][1], dtype=np.uint16) for t in terms]) if terms else np.empty(0, np.uint16)
+        project_df = np.array([len(np.unique(project[np.frombuffer(postings[t][0], dtype=np.int32)])) for t in terms],
+                              dtype=np.int32)
+        return cls(terms, indptr, rows, tf, np.frombuffer(doc_len, dtype=np.uint16).copy(), project_df, len(project_ids))
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        save_npy_atomic(os.path.join(directory, "indptr.npy"), self.indptr)
+        save_npy_atomic(os.path.join(directory, "rows.npy"), self.rows)
+        save_npy_atomic(os.path.join(directory, "tf.npy"), self.tf)
+        save_npy_atomic(os.path.join(directory, "doc_len.npy"), self.doc_len)
+        save_npy_atomic(os.path.join(directory, "project_df.npy"), self.project_df)
+        save_json_atomic(os.path.join(directory, "terms.json"), list(self.term_ids))
+        save_json_atomic(os.path.join(directory, "projects.json"), {"n_projects": self.n_projects})
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = False) -> "KeywordIndex":
+        mode = "r" if mmap else None
+        arrays = [np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode) for name in ("indptr", "rows", "tf", "doc_len")]
+        with open(os.path.join(directory, "terms.json"), encoding="utf-8") as f:
+            terms = json.load(f)
+        project_df, n_projects = None, None
+        if os.path.exists(os.path.join(directory, "projects.json")):
+            project_df = np.load(os.path.join(directory, "project_df.npy"), mmap_mode=mode)
+            with open(os.path.join(directory, "projects.json"), encoding="utf-8") as f:
+                n_projects = json.load(f)["n_projects"]
+        return cls(terms, *arrays, project_df=project_df, n_projects=n_projects)
+
+    # ---------- search ----------
+    def search(self, query: str, k: int = 10, mask: Optional[np.ndarray] = None, max_df: float = 1.0) -> List[int]:
+        """
+        BM25 top-k rows for `query`, restricted to `mask` if given. Terms found in more
+        than `max_df` of all projects (city names, "road", ...) are skipped: they only say
+        what the structured filters already say and would flood the ranking with ties.
+        Document frequency counts projects, so a name shared by a project's many variant
+        rows is not mistaken for a common word.
+        """
+        n = self.n_projects
+        parts_rows, parts_scores = [], []
+        for term in set(tokenize(query)):
+            t = self.term_ids.get(term)
+            if t is None:
+                continue
+            lo, hi = int(self.indptr[t]), int(self.indptr[t + 1])
+            df = int(self.project_df[t])
+            if df > max(max_df * n, MIN_SKIPPED_DF):
+                continue
+            rows = np.asarray(self.rows[lo:hi])
+            tf = self.tf[lo:hi].astype(np.float32)
+            norm = K1 * (1 - B + B * self.doc_len[rows] / self.avgdl)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            parts_rows.append(rows)
+            parts_scores.append(idf * tf * (K1 + 1) / (tf + norm))
+        if not parts_rows:
+            return []
+
+        rows = np.concatenate(parts_rows)
+        scores = np.concatenate(parts_scores)
+        if mask is not None:
+            keep = mask[rows]
+            rows, scores = rows[keep], scores[keep]
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        totals = np.bincount(inverse, weights=scores)
+        top = np.argsort(-totals, kind="stable")[:k]
+        return unique_rows[top].tolist()
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int, rrf_k: int = 60) -> List[Tuple[int, float]]:
+    """Merge several best-first row rankings: score(row) = sum of 1 / (rrf_k + rank). Returns (row, score)."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, 1):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
@@ -0,0 +1,203 @@
+# metadata_index.py
+import os
+import json
+from array import array
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+from langchain.schema import Document
+from src.keyword_index import tokenize
+from src.metadata_store import extend_array, save_npy_atomic, save_json_atomic
+
+# ---------------------------
+# Columnar metadata index
+# ---------------------------
+# One row per FAISS vector (row i == FAISS position i). Used to turn the parsed
+# query filters into an allowed-ID set *before* vector search, so filtered
+# queries get exact top-k matches instead of post-filtering an over-fetched list.
+
+# categorical columns stored as int32 codes into a vocabulary of lowercased values
+CATEGORICAL = ("city", "bhk", "status", "place")
+# parsed filter -> column it is matched against
+FILTER_COLUMNS = (("city", "city"), ("bhk", "bhk"), ("status", "status"), ("locality_or_project", "place"))
+
+
+def _row_values(md: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize one Document's metadata into the indexed columns."""
+    price = md.get("price")
+    if price is None and md.get("price_in_cr") is not None:
+        price = float(md["price_in_cr"]) * 1e7
+    try:
+        price = float(price) if price is not None else np.nan
+    except (TypeError, ValueError):
+        price = np.nan
+    # "place" is what the locality/project filter searches: locality, address, slug, projectName
+    place = " | ".join(str(md.get(key) or "") for key in ("locality", "address", "slug", "projectName"))
+    return {
+        "price": price,
+        "city": (md.get("city") or "").lower(),
+        "bhk": (md.get("BHK") or md.get("bhk") or "").lower(),
+        "status": (md.get("status") or "").lower(),
+        "place": place.lower(),
+    }
+
+
+class MetadataIndex:
+    def __init__(self, price: np.ndarray, codes: Dict[str, np.ndarray], vocab: Dict[str, List[str]],
+                 live: Optional[np.ndarray] = None):
+        self.price = price
+        self.codes = codes
+        self.vocab = vocab
+        # live[i] == False marks a tombstoned row (listing deleted or superseded by incremental ingest)
+        self.live = live if live is not None else np.ones(len(price), dtype=bool)
+        self.all_live = bool(self.live.all())
+        self._place_postings: Optional[Dict[str, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return len(self.price)
+
+    # ---------- build / persist ----------
+    @classmethod
+    def from_documents(cls, docs: List[Document]) -> "MetadataIndex":
+        writer = MetadataIndexWriter()
+        writer.add_documents(docs)
+        return writer.build()
+
+    def append(self, docs: List[Document]) -> "MetadataIndex":
+        """New index with `docs` added as rows len(self)..len(self)+len(docs)-1 (vocabularies are extended)."""
+        writer = MetadataIndexWriter(self)
+        writer.add_documents(docs)
+        return writer.build()
+
+    def tombstone(self, rows: List[int]) -> None:
+        self.live = np.array(self.live, dtype=bool)  # writable copy (may be a read-only memmap)
+        self.live[np.asarray(rows, dtype=np.int64)] = False
+        self.all_live = bool(self.live.all())
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        save_npy_atomic(os.path.join(directory, "price.npy"), self.price)
+        save_npy_atomic(os.path.join(directory, "live.npy"), self.live)
+        for col in CATEGORICAL:
+            save_npy_atomic(os.path.join(directory, f"{col}.npy"), self.codes[col])
+        save_json_atomic(os.path.join(directory, "vocab.json"), self.vocab)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = False) -> "MetadataIndex":
+        """With mmap=True the columns are read-only memory maps shared across worker processes."""
+        mode = "r" if mmap else None
+        price = np.load(os.path.join(directory, "price.npy"), mmap_mode=mode)
+        codes = {col: np.load(os.path.join(directory, f"{col}.npy"), mmap_mode=mode) for col in CATEGORICAL}
+        live_path = os.path.join(directory, "live.npy")
+        live = np.load(live_path, mmap_mode=mode) if os.path.exists(live_path) else None
+        with open(os.path.join(directory, "vocab.json"), encoding="utf-8") as f:
+            vocab = json.load(f)
+        return cls(price, codes, vocab, live)
+
+    # ---------- filtering ----------
+    def _place_tokens(self) -> Dict[str, np.ndarray]:
+        """token -> codes of the place values containing it (built once per process, on first use)."""
+        if self._place_postings is None:
+            postings: Dict[str, array] = {}
+            for code, value in enumerate(self.vocab["place"]):
+                for token in set(tokenize(value)):
+                    postings.setdefault(token, array("i")).append(code)
+            self._place_postings = {t: np.frombuffer(codes, dtype=np.int32) for t, codes in postings.items()}
+        return self._place_postings
+
+    def _allowed(self, col: str, needle: str) -> np.ndarray:
+        """
+        Boolean table over the codes of `col`: allowed[code] is True if the value matches.
+        city / bhk / status: `needle` is a substring of the value (small vocabularies).
+        place: every token of `needle` is a token of the value, looked up in token
+        postings instead of scanning one string per listing.
+        """
+        needle = needle.lower()
+        allowed = np.zeros(len(self.vocab[col]), dtype=bool)
+        if col != "place":
+            allowed[[code for code, value in enumerate(self.vocab[col]) if needle in value]] = True
+            return allowed
+        tokens = tokenize(needle)
+        if not tokens:
+            allowed[:] = True
+            return allowed
+        postings = self._place_tokens()
+        allowed[postings.get(tokens[0], [])] = True
+        for token in tokens[1:]:
+            hit = np.zeros_like(allowed)
+            hit[postings.get(token, [])] = True
+            allowed &= hit
+        return allowed
+
+    def _evaluate(self, filters: Dict[str, Any], rows: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        def values(column: np.ndarray) -> np.ndarray:
+            return column if rows is None else column[rows]
+
+        mask = None
+
+        def both(m):
+            return m if mask is None else mask & m
+
+        for key, col in FILTER_COLUMNS:
+            if filters.get(key):
+                mask = both(self._allowed(col, filters[key])[values(self.codes[col])])
+        if filters.get("budget_rupees") is not None:
+            # NaN prices compare False, so listings without a price are excluded
+            mask = both(values(self.price) <= float(filters["budget_rupees"]))
+        if filters.get("min_budget_rupees") is not None:
+            mask = both(values(self.price) >= float(filters["min_budget_rupees"]))
+        if not self.all_live:
+            mask = both(values(self.live))
+        return mask
+
+    def mask(self, filters: Dict[str, Any]) -> Optional[np.ndarray]:
+        """
+        Boolean mask of live rows satisfying the parsed filters,
+        or None if no filter is set and there are no tombstoned rows.
+        """
+        return self._evaluate(filters, None)
+
+    def mask_rows(self, rows: List[int], filters: Dict[str, Any]) -> np.ndarray:
+        """Same test for candidate `rows` only: boolean array aligned with `rows`."""
+        rows = np.asarray(rows, dtype=np.int64)
+        mask = self._evaluate(filters, rows)
+        return np.ones(len(rows), dtype=bool) if mask is None else mask
+
+
+class MetadataIndexWriter:
+    """
+    Accumulates the filter columns batch by batch, so streaming ingest never has to
+    keep its Documents around. Pass `base` to continue an existing index.
+    """
+
+    def __init__(self, base: Optional[MetadataIndex] = None):
+        self._price = array("d")
+        self._codes: Dict[str, array] = {col: array("q") for col in CATEGORICAL}
+        self._lookup: Dict[str, Dict[str, int]] = {col: {} for col in CATEGORICAL}
+        self._live = array("b")
+        if base is not None:
+            extend_array(self._price, base.price, np.float64)
+            extend_array(self._live, base.live, np.int8)
+            for col in CATEGORICAL:
+                extend_array(self._codes[col], base.codes[col], np.int64)
+                self._lookup[col] = {value: code for code, value in enumerate(base.vocab[col])}
+
+    def __len__(self) -> int:
+        return len(self._price)
+
+    def add_documents(self, docs: List[Document]) -> None:
+        for doc in docs:
+            row = _row_values(doc.metadata or {})
+            self._price.append(row["price"])
+            for col in CATEGORICAL:
+                lookup = self._lookup[col]
+                self._codes[col].append(lookup.setdefault(row[col], len(lookup)))
+            self._live.append(1)
+
+    def build(self) -> MetadataIndex:
+        return MetadataIndex(
+            np.frombuffer(self._price, dtype=np.float64).copy(),
+            {col: np.frombuffer(self._codes[col], dtype=np.int64).astype(np.int32) for col in CATEGORICAL},
+            {col: list(self._lookup[col]) for col in CATEGORICAL},
+            np.frombuffer(self._live, dtype=np.int8).astype(bool),
+        )
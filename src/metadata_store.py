@@ -0,0 +1,208 @@
+# metadata_store.py
+import os
+import json
+import math
+from array import array
+from datetime import datetime
+from typing import Dict, Any, List, Iterable
+
+import numpy as np
+from langchain.schema import Document
+
+# ---------------------------
+# Columnar document store (replaces the pickled LangChain docstore)
+# ---------------------------
+# Layout of the store directory, one row per FAISS vector (row i == FAISS id i):
+#   num_<field>.npy   float64 columns (NaN = missing)
+#   cat_<field>.npy   int32 codes into schema.json["vocab"][field]
+#   strings.bin       UTF-8 blob of every free-text field, row-major
+#   offsets.npy       int64 offsets into strings.bin, len == rows * len(STRING_FIELDS) + 1
+#   schema.json       field lists + vocabularies
+# Everything is plain arrays/JSON, so loading is safe (no pickle), takes milliseconds
+# and can be memory-mapped; get() decodes only the rows that are asked for.
+
+NUMERIC_FIELDS = ("price", "price_in_cr", "carpetArea", "bathrooms", "balcony")
+CATEGORICAL_FIELDS = ("city", "BHK", "status", "projectType", "projectCategory", "furnishedType", "lift")
+STRING_FIELDS = (
+    "id", "slug", "projectName", "locality", "address", "amenities",
+    "possessionDate", "createdAt", "updatedAt", "page_content",
+)
+DATE_FIELDS = ("createdAt", "updatedAt")
+
+
+def save_npy_atomic(path: str, array: np.ndarray) -> None:
+    """
+    Write to a temp file and rename over the target: processes that have the old
+    file memory-mapped keep reading the old inode instead of crashing on truncation.
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def save_json_atomic(path: str, obj: Any) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def extend_array(target: array, values: np.ndarray, dtype) -> None:
+    """Append a numpy column to an array.array in one copy (no per-element Python objects)."""
+    target.frombytes(np.ascontiguousarray(values, dtype=dtype).tobytes())
+
+
+def _to_float(value: Any) -> float:
+    try:
+        return float(value) if value is not None else math.nan
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _to_str(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class MetadataStoreWriter:
+    """
+    Appends Documents row by row; strings are written to disk as they arrive and
+    the numeric / code / offset columns are kept in compact arrays (8 bytes per value),
+    so ingest can stream millions of rows through it.
+    append=True continues an existing store (incremental ingest) instead of starting a new one.
+    """
+
+    def __init__(self, directory: str, append: bool = False):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._blob_path = os.path.join(directory, "strings.bin")
+        self._numeric: Dict[str, array] = {f: array("d") for f in NUMERIC_FIELDS}
+        self._codes: Dict[str, array] = {f: array("q") for f in CATEGORICAL_FIELDS}
+        self._lookup: Dict[str, Dict[Any, int]] = {f: {} for f in CATEGORICAL_FIELDS}
+        self._offsets = array("q", [0])
+        self.rows = 0
+        if append:
+            existing = MetadataStore(directory)
+            self.rows = existing.rows
+            self._offsets = array("q")
+            extend_array(self._offsets, existing.offsets, np.int64)
+            for f in NUMERIC_FIELDS:
+                extend_array(self._numeric[f], existing.numeric[f], np.float64)
+            for f in CATEGORICAL_FIELDS:
+                extend_array(self._codes[f], existing.codes[f], np.int64)
+                self._lookup[f] = {value: code for code, value in enumerate(existing.vocab[f])}
+            # Appending in place is safe for readers: they only map the old byte range.
+            # Anything past the last offset (e.g. from an interrupted run) is dropped first.
+            self._blob = open(self._blob_path, "r+b")
+            self._blob.truncate(self._offsets[-1])
+            self._blob.seek(self._offsets[-1])
+            self._final_blob_path = None
+        else:
+            self._blob = open(self._blob_path + ".tmp", "wb")
+            self._final_blob_path = self._blob_path
+
+    def add(self, doc: Document) -> int:
+        """Append one Document and return its row id."""
+        md = doc.metadata or {}
+        for f in NUMERIC_FIELDS:
+            self._numeric[f].append(_to_float(md.get(f)))
+        for f in CATEGORICAL_FIELDS:
+            value = md.get(f)
+            value = value if isinstance(value, (bool, int, float)) or value is None else str(value)
+            self._codes[f].append(self._lookup[f].setdefault(value, len(self._lookup[f])))
+        for f in STRING_FIELDS:
+            raw = doc.page_content if f == "page_content" else md.get(f)
+            data = _to_str(raw).encode("utf-8")
+            self._blob.write(data)
+            self._offsets.append(self._offsets[-1] + len(data))
+        self.rows += 1
+        return self.rows - 1
+
+    def add_documents(self, docs: Iterable[Document]) -> None:
+        for doc in docs:
+            self.add(doc)
+
+    def abort(self) -> None:
+        """Stop without touching the existing store (a new store's temp blob is removed)."""
+        self._blob.close()
+        if self._final_blob_path:
+            os.remove(self._final_blob_path + ".tmp")
+
+    def close(self) -> None:
+        self._blob.close()
+        if self._final_blob_path:
+            os.replace(self._final_blob_path + ".tmp", self._final_blob_path)
+        save_npy_atomic(os.path.join(self.directory, "offsets.npy"), np.frombuffer(self._offsets, dtype=np.int64))
+        for f in NUMERIC_FIELDS:
+            save_npy_atomic(os.path.join(self.directory, f"num_{f}.npy"), np.frombuffer(self._numeric[f], dtype=np.float64))
+        for f in CATEGORICAL_FIELDS:
+            save_npy_atomic(os.path.join(self.directory, f"cat_{f}.npy"), np.frombuffer(self._codes[f], dtype=np.int64).astype(np.int32))
+        schema = {
+            "rows": self.rows,
+            "numeric": list(NUMERIC_FIELDS),
+            "categorical": list(CATEGORICAL_FIELDS),
+            "strings": list(STRING_FIELDS),
+            "vocab": {f: list(self._lookup[f]) for f in CATEGORICAL_FIELDS},
+        }
+        # schema.json goes last: it carries the row count readers trust
+        save_json_atomic(os.path.join(self.directory, "schema.json"), schema)
+
+
+class MetadataStore:
+    """Read side: fetch Documents by row id without materializing the whole store."""
+
+    def __init__(self, directory: str, mmap: bool = True):
+        with open(os.path.join(directory, "schema.json"), encoding="utf-8") as fh:
+            schema = json.load(fh)
+        mode = "r" if mmap else None
+        self.rows: int = schema["rows"]
+        self.string_fields: List[str] = schema["strings"]
+        self.vocab: Dict[str, List[Any]] = schema["vocab"]
+        self.numeric = {f: np.load(os.path.join(directory, f"num_{f}.npy"), mmap_mode=mode) for f in schema["numeric"]}
+        self.codes = {f: np.load(os.path.join(directory, f"cat_{f}.npy"), mmap_mode=mode) for f in schema["categorical"]}
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode=mode)
+        blob_path = os.path.join(directory, "strings.bin")
+        if os.path.getsize(blob_path) and mmap:
+            self.blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+        else:
+            self.blob = np.fromfile(blob_path, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def _string(self, row: int, field_pos: int) -> str:
+        i = row * len(self.string_fields) + field_pos
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def metadata(self, row: int) -> Dict[str, Any]:
+        md: Dict[str, Any] = {}
+        for pos, f in enumerate(self.string_fields):
+            if f == "page_content":
+                continue
+            value = self._string(row, pos)
+            md[f] = (value or None) if f in DATE_FIELDS else value
+        for f, column in self.numeric.items():
+            value = float(column[row])
+            md[f] = None if math.isnan(value) else value
+        for f, column in self.codes.items():
+            md[f] = self.vocab[f][int(column[row])]
+        return md
+
+    def string(self, row: int, field: str) -> str:
+        return self._string(row, self.string_fields.index(field))
+
+    def column(self, field: str) -> List[str]:
+        """Decode one string field for every row (e.g. the listing ids, for incremental ingest)."""
+        pos = self.string_fields.index(field)
+        return [self._string(row, pos) for row in range(self.rows)]
+
+    def get(self, row: int) -> Document:
+        page_content = self._string(row, self.string_fields.index("page_content"))
+        return Document(page_content=page_content, metadata=self.metadata(row))
+
+    def get_many(self, rows: Iterable[int]) -> List[Document]:
+        return [self.get(int(r)) for r in rows]
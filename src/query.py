@@ -1,19 +1,33 @@
 import os
+import faiss
+import numpy as np
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
+from src.metadata_store import MetadataStore
+from src.metadata_index import MetadataIndex
+from src.vector_index import search_parameters
 
-# Path to your saved FAISS vectorstore
-VECTORSTORE_DIR = "../vectorStore"
+# Path to your saved FAISS vectorstore (run as `python -m src.query` from the project root)
+VECTORSTORE_DIR = os.getenv("VECTORSTORE_DIR", "vectorStore")
 
 def query_faiss():
     # Load embeddings
     embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
 
-    # Load FAISS vectorstore
-    db = FAISS.load_local(VECTORSTORE_DIR, embeddings, allow_dangerous_deserialization=True)
+    # Load FAISS index + metadata store
+    index = faiss.read_index(os.path.join(VECTORSTORE_DIR, "index.faiss"))
+    store = MetadataStore(os.path.join(VECTORSTORE_DIR, "store"))
+
+    # Skip rows tombstoned by incremental ingest (meta/live.npy); older vectorstores have no meta/
+    params, live_count = None, len(store)
+    meta_dir = os.path.join(VECTORSTORE_DIR, "meta")
+    if os.path.isdir(meta_dir):
+        live = MetadataIndex.load(meta_dir).live
+        live_count = int(live.sum())
+        if live_count < len(live):
+            params = search_parameters(index, faiss.IDSelectorBitmap(np.packbits(live, bitorder="little")))
 
     print("✅ FAISS vectorstore loaded successfully.")
-    print(f"Total chunks in DB: {len(db.docstore._dict)}")
+    print(f"Total listings in DB: {live_count} ({len(store) - live_count} tombstoned rows skipped)")
 
     while True:
         query = input("\nEnter your query (or type 'exit' to quit): ").strip()
@@ -22,7 +36,9 @@ def query_faiss():
             break
 
         # Perform similarity search
-        results = db.similarity_search(query, k=5)  # top 5 results
+        vector = np.array([embeddings.embed_query(query)], dtype=np.float32)
+        _, ids = index.search(vector, 5, params=params)  # top 5 live results
+        results = store.get_many(i for i in ids[0] if i != -1)
 
         if not results:
             print("❌ No matching documents found.")
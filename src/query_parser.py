@@ -0,0 +1,213 @@
+# query_parser.py
+import os
+import re
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.metadata_store import MetadataStore, save_json_atomic
+
+# ---------------------------
+# Single-pass query parser
+# ---------------------------
+# The query is lowercased and tokenized once by one compiled pattern (BHK, money
+# amounts, words). Word sequences are then matched longest-first against a token
+# trie of known phrases: cities, localities and project names from the ingested
+# metadata (dictionary.json, written by ingest.py) plus built-in cities and status
+# phrases. Matching whole tokens means "uc" no longer fires inside "luck".
+# A money amount is an upper budget only after an upper cue ("under 1.2 cr") and a
+# lower one after a lower cue ("above 80 lakh"); "between 50 lakh and 1 cr" sets both.
+# An amount without any cue is ignored, except a bare rupee figure of 6+ digits; a small
+# number with neither unit nor ₹ / rs is not money even after a cue ("within 2 km").
+
+DICTIONARY_FILE = "dictionary.json"
+
+_TOKENS = re.compile(
+    r"(?P<bhk>\d+)\s*-?\s*bhk\b"
+    r"|(?P<money>(?:(?P<currency>₹|rs\.?|inr)\s*)?(?P<amount>\d+(?:\.\d+)?))\s*(?P<unit>crores?|cr|lakhs?|lacs?|l|k)?\b"
+    r"|(?P<word>[a-z][a-z0-9]*)"
+)
+_WORDS = re.compile(r"[a-z][a-z0-9]*")
+_DIGIT_COMMA = re.compile(r"(?<=\d),(?=\d)")
+
+UNITS = {"cr": 1e7, "crore": 1e7, "crores": 1e7, "l": 1e5, "lakh": 1e5, "lakhs": 1e5, "lac": 1e5, "lacs": 1e5, "k": 1e3}
+BUDGET_CUES = {"under", "below", "upto", "within", "max", "maximum", "budget"}
+BUDGET_CUE_PAIRS = {("up", "to"), ("less", "than"), ("budget", "of")}
+MIN_BUDGET_CUES = {"above", "over", "min", "minimum", "starting", "from", "atleast", "beyond"}
+MIN_BUDGET_CUE_PAIRS = {("more", "than"), ("greater", "than"), ("at", "least"), ("starting", "at")}
+# cues after the amount: "1 cr and above", "80 lakh onwards", "1 cr or less"
+BUDGET_SUFFIXES = {("or", "less"), ("and", "below"), ("or", "below")}
+MIN_BUDGET_SUFFIXES = {("and", "above"), ("or", "more"), ("and", "more"), ("onwards",), ("plus",)}
+# plain numbers (no unit, no ₹ / rs) below this are distances, years, floors... not prices
+MIN_PLAIN_AMOUNT = 1e4
+RANGE_JOINERS = {"to", "and"}  # "50 lakh to 1 cr", "between 50 and 80 lakh"; "50-80 lakh" has no joiner word
+PLACE_CUES = {"in", "near", "at"}
+
+# extend this list as you need; metadata cities are added on top
+BUILTIN_CITIES = {
+    "pune": "Pune", "mumbai": "Mumbai", "delhi": "Delhi", "bangalore": "Bangalore", "bangaluru": "Bangalore",
+    "bengaluru": "Bangalore", "chennai": "Chennai", "hyderabad": "Hyderabad", "kolkata": "Kolkata",
+}
+STATUS_PHRASES = {
+    "ready": "READY_TO_MOVE", "ready to move": "READY_TO_MOVE", "rtm": "READY_TO_MOVE",
+    "under construction": "UNDER_CONSTRUCTION", "uc": "UNDER_CONSTRUCTION",
+}
+# words that never name a place / project on their own
+GENERIC_WORDS = {
+    "a", "an", "the", "and", "or", "of", "for", "with", "to", "by", "in", "near", "at", "on", "me", "show", "find",
+    "flat", "flats", "apartment", "apartments", "home", "homes", "house", "houses", "property", "properties",
+    "project", "projects", "villa", "villas", "tower", "towers", "residency", "heights", "park", "city", "new",
+    "bhk", "cr", "crore", "lakh", "lakhs", "price", "budget", "sale", "buy", "rent", "good", "best", "cheap",
+}
+# city first: a name that is both a city and a locality filters on the (exact) city column
+PRIORITY = {"status": 0, "city": 1, "locality": 2, "project": 3}
+_END = ""
+# words that end an unknown place name ("in baner over 1 cr")
+_CUE_WORDS = BUDGET_CUES | MIN_BUDGET_CUES | {"between"} | {w for pair in BUDGET_CUE_PAIRS | MIN_BUDGET_CUE_PAIRS for w in pair}
+
+
+def build_dictionary(store: MetadataStore) -> Dict[str, List[str]]:
+    """Distinct city / locality / project names of the ingested listings."""
+    localities, projects = set(), set()
+    for row in range(store.rows):
+        localities.add(store.string(row, "locality").strip())
+        projects.add(store.string(row, "projectName").strip())
+    cities = {str(c).strip() for c in store.vocab.get("city", []) if c}
+    return {
+        "city": sorted(c for c in cities if c),
+        "locality": sorted(x for x in localities if x),
+        "project": sorted(x for x in projects if x),
+    }
+
+
+def save_dictionary(directory: str, dictionary: Dict[str, List[str]]) -> None:
+    save_json_atomic(os.path.join(directory, DICTIONARY_FILE), dictionary)
+
+
+def load_dictionary(directory: str) -> Dict[str, List[str]]:
+    path = os.path.join(directory, DICTIONARY_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class QueryParser:
+    def __init__(self, dictionary: Optional[Dict[str, List[str]]] = None):
+        self.trie: Dict[str, Any] = {}
+        for phrase, value in STATUS_PHRASES.items():
+            self._add(phrase, "status", value)
+        for phrase, value in BUILTIN_CITIES.items():
+            self._add(phrase, "city", value)
+        for kind in ("city", "locality", "project"):
+            for name in (dictionary or {}).get(kind, []):
+                words = _WORDS.findall(name.lower())
+                # skip names made only of generic words ("The Park") and very short one-word names
+                if not words or all(w in GENERIC_WORDS for w in words) or (len(words) == 1 and len(words[0]) < 3):
+                    continue
+                self._add(" ".join(words), kind, name)
+
+    def _add(self, phrase: str, kind: str, value: str) -> None:
+        node = self.trie
+        for word in phrase.split():
+            node = node.setdefault(word, {})
+        current = node.get(_END)
+        if current is None or PRIORITY[kind] < PRIORITY[current[0]]:
+            node[_END] = (kind, value)
+
+    def _match(self, words: List[Optional[str]], i: int) -> Optional[Tuple[int, str, str]]:
+        """Longest known phrase starting at token i: (end token, kind, value)."""
+        node, best = self.trie, None
+        for j in range(i, len(words)):
+            node = node.get(words[j]) if words[j] is not None else None
+            if node is None:
+                break
+            if _END in node:
+                best = (j + 1,) + node[_END]
+        return best
+
+    def parse(self, query: str) -> Dict[str, Any]:
+        """All filters in one pass; same keys as the old parse_* chain."""
+        text = _DIGIT_COMMA.sub("", (query or "").lower())
+        tokens = list(_TOKENS.finditer(text))
+        words = [t.group("word") for t in tokens]  # None for BHK / money tokens
+        found: Dict[str, Any] = {"budget_rupees": None, "min_budget_rupees": None, "bhk": None, "city": None,
+                                 "status": None}
+        place: Optional[str] = None
+        place_guess: Optional[str] = None
+
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if token.group("bhk"):
+                found["bhk"] = found["bhk"] or f"{int(token.group('bhk'))}BHK"
+                i += 1
+                continue
+            if token.group("money"):
+                low, high, i = self._budget(tokens, words, i)
+                if found["min_budget_rupees"] is None:
+                    found["min_budget_rupees"] = low
+                if found["budget_rupees"] is None:
+                    found["budget_rupees"] = high
+                continue
+
+            match = self._match(words, i)
+            if match is not None:
+                end, kind, value = match
+                if kind in ("locality", "project"):
+                    place = place or value
+                elif found[kind] is None:
+                    found[kind] = value
+                i = end
+                continue
+
+            if words[i] in PLACE_CUES and place_guess is None and self._match(words, i + 1) is None:
+                # unknown name after in / near / at: keep up to 3 plain words
+                guess = []
+                for j in range(i + 1, min(i + 4, len(tokens))):
+                    if words[j] is None or words[j] in GENERIC_WORDS or words[j] in _CUE_WORDS or self._match(words, j):
+                        break
+                    guess.append(words[j])
+                if guess:
+                    place_guess = " ".join(guess).title()
+            i += 1
+
+        found["locality_or_project"] = place or place_guess
+        return found
+
+    @staticmethod
+    def _budget(tokens: List["re.Match"], words: List[Optional[str]], i: int) -> Tuple[Optional[float], Optional[float], int]:
+        """(min rupees, max rupees, next token) for the money amount at token i (and its range partner)."""
+        def rupees(token: "re.Match", unit: Optional[str]) -> float:
+            return float(token.group("amount")) * UNITS.get(unit or "", 1.0)
+
+        def is_money(token: "re.Match", unit: Optional[str]) -> bool:
+            return bool(unit or token.group("currency")) or float(token.group("amount")) >= MIN_PLAIN_AMOUNT
+
+        token, unit = tokens[i], tokens[i].group("unit")
+        previous = words[i - 1] if i >= 1 else None
+        pair = (words[i - 2], words[i - 1]) if i >= 2 else None
+        following = tuple(words[i + 1:i + 3])
+
+        # range: the second amount follows directly ("50-80 lakh") or after "to" / "and"
+        for j in (i + 1, i + 2):
+            if j < len(tokens) and tokens[j].group("money") and (j == i + 1 or words[i + 1] in RANGE_JOINERS):
+                second_unit = tokens[j].group("unit")
+                if not (is_money(token, unit or second_unit) and is_money(tokens[j], second_unit)):
+                    return None, None, j + 1
+                bounds = sorted((rupees(token, unit or second_unit), rupees(tokens[j], second_unit)))
+                return bounds[0], bounds[1], j + 1
+
+        if not is_money(token, unit):
+            return None, None, i + 1
+        if previous in MIN_BUDGET_CUES or pair in MIN_BUDGET_CUE_PAIRS:
+            return rupees(token, unit), None, i + 1
+        if previous in BUDGET_CUES or pair in BUDGET_CUE_PAIRS:
+            return None, rupees(token, unit), i + 1
+        if following[:1] in MIN_BUDGET_SUFFIXES or following in MIN_BUDGET_SUFFIXES:
+            return rupees(token, unit), None, i + 1
+        if following in BUDGET_SUFFIXES:
+            return None, rupees(token, unit), i + 1
+        if unit is None and float(token.group("amount")) >= 1e5:
+            # bare rupee figure ("12000000"): an upper budget, as before
+            return None, rupees(token, None), i + 1
+        return None, None, i + 1
@@ -0,0 +1,221 @@
+# resilience.py
+import asyncio
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+# ---------------------------
+# Deadlines, retries and a circuit breaker around the LLM
+# ---------------------------
+# Every LLM call goes through one LLMGuard:
+#   - a per-attempt deadline (asyncio.wait_for on the async paths; the client's own
+#     request timeout on the blocking path),
+#   - bounded retries with exponential backoff and full jitter,
+#   - a circuit breaker: after `failure_threshold` consecutive failed calls it opens and
+#     calls are rejected at once (the caller answers from a template instead) until
+#     `reset_after` seconds have passed; then one trial call is let through (half-open)
+#     and its outcome closes or re-opens the circuit.
+# metrics() reports counters and the time spent in each breaker state.
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class LLMUnavailable(Exception):
+    """The LLM could not answer: circuit open, deadline exceeded or retries exhausted."""
+
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, connection errors, 408 / 429 / 5xx are retried; other 4xx (bad key, bad request) are not."""
+    status = getattr(error, "status_code", None)
+    return not (isinstance(status, int) and 400 <= status < 500 and status not in (408, 429))
+
+
+def is_timeout(error: Exception) -> bool:
+    return isinstance(error, (asyncio.TimeoutError, TimeoutError)) or "Timeout" in type(error).__name__
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_after: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_after = reset_after
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._since = time.monotonic()
+        self.transitions = {CLOSED: 0, OPEN: 0, HALF_OPEN: 0}
+        self.seconds_in = {CLOSED: 0.0, OPEN: 0.0, HALF_OPEN: 0.0}
+
+    def _move(self, state: str) -> None:
+        now = time.monotonic()
+        self.seconds_in[self._state] += now - self._since
+        self._since = now
+        if state != self._state:
+            self.transitions[state] += 1
+            print(f"⚡ LLM circuit {self._state} -> {state}")
+        self._state = state
+        if state == OPEN:
+            self._opened_at = now
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        """May a call go through now? In half-open state only one trial call at a time."""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_after:
+                self._move(HALF_OPEN)
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            if self._state != CLOSED:
+                self._move(CLOSED)
+
+    def release(self) -> None:
+        """The call was abandoned (client went away) without an outcome: free the half-open trial slot."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._move(OPEN)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            seconds = dict(self.seconds_in)
+            seconds[self._state] += time.monotonic() - self._since
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "transitions": dict(self.transitions),
+                "seconds_in_state": {state: round(value, 1) for state, value in seconds.items()},
+            }
+
+
+class LLMGuard:
+    def __init__(self, timeout: float = 15.0, retries: int = 2, backoff_base: float = 0.5, backoff_max: float = 4.0,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.timeout = timeout
+        self.retries = max(0, retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self._lock = threading.Lock()
+        self.counters = {k: 0 for k in ("calls", "attempts", "successes", "failures", "timeouts", "retries",
+                                        "rejected", "fallbacks")}
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += n
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(max, base * 2**attempt)]."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _admit(self) -> None:
+        self.count("calls")
+        if not self.breaker.allow():
+            self.count("rejected")
+            raise LLMUnavailable("circuit open")
+
+    def _failed(self, error: Exception, attempt: int) -> bool:
+        """Record a failed attempt; True if it should be retried."""
+        self.count("timeouts" if is_timeout(error) else "failures")
+        if attempt < self.retries and is_retryable(error):
+            self.count("retries")
+            return True
+        self.breaker.record_failure()
+        return False
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """Blocking call (the deadline is the client's request timeout)."""
+        self._admit()
+        for attempt in range(self.retries + 1):
+            self.count("attempts")
+            try:
+                result = fn()
+            except Exception as e:
+                if not self._failed(e, attempt):
+                    raise LLMUnavailable(f"{type(e).__name__}: {e}") from e
+                time.sleep(self.backoff(attempt))
+                continue
+            self.count("successes")
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Await factory() with a deadline per attempt."""
+        self._admit()
+        try:
+            for attempt in range(self.retries + 1):
+                self.count("attempts")
+                try:
+                    result = await asyncio.wait_for(factory(), self.timeout)
+                except Exception as e:
+                    if not self._failed(e, attempt):
+                        raise LLMUnavailable(f"{type(e).__name__}: {e}") from e
+                    await asyncio.sleep(self.backoff(attempt))
+                    continue
+                self.count("successes")
+                self.breaker.record_success()
+                return result
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+
+    async def astream(self, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """
+        Stream from factory(). Until the first chunk arrives the stream is retried like
+        acall; after that a failure or a gap longer than the deadline ends the stream with
+        LLMUnavailable (chunks already sent cannot be taken back).
+        """
+        self._admit()
+        try:
+            for attempt in range(self.retries + 1):
+                self.count("attempts")
+                stream = factory().__aiter__()
+                started = False
+                try:
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(stream.__anext__(), self.timeout)
+                        except StopAsyncIteration:
+                            break
+                        started = True
+                        yield chunk
+                except Exception as e:
+                    if started:
+                        self.count("timeouts" if is_timeout(e) else "failures")
+                        self.breaker.record_failure()
+                        raise LLMUnavailable(f"stream interrupted: {type(e).__name__}: {e}") from e
+                    if not self._failed(e, attempt):
+                        raise LLMUnavailable(f"{type(e).__name__}: {e}") from e
+                    await asyncio.sleep(self.backoff(attempt))
+                    continue
+                self.count("successes")
+                self.breaker.record_success()
+                return
+        except (asyncio.CancelledError, GeneratorExit):
+            # the client went away before an outcome
+            self.breaker.release()
+            raise
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        return dict(counters, breaker=self.breaker.snapshot())
@@ -0,0 +1,199 @@
+# vector_index.py
+import os
+import json
+import math
+import time
+from typing import Dict, Any, Optional, Tuple
+
+import faiss
+import numpy as np
+
+# ---------------------------
+# Reading FAISS indexes memory-mapped
+# ---------------------------
+# With several uvicorn workers every process used to deserialize its own copy of
+# the vectors. Memory-mapping the file instead lets all workers share the same
+# physical pages through the OS page cache, and makes worker spawn near-instant.
+
+def read_index_mmap(path: str) -> faiss.Index:
+    """
+    Read a FAISS index read-only and memory-mapped.
+    IVF indexes map their inverted lists (IO_FLAG_MMAP); flat / HNSW indexes map
+    their code arrays in place (IO_FLAG_MMAP_IFC, faiss >= 1.10).
+    """
+    with open(path, "rb") as f:
+        fourcc = f.read(4)
+    if fourcc.startswith(b"Iw"):  # IndexIVF* fourccs all start with "Iw"
+        flags = faiss.IO_FLAG_MMAP
+    else:
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    return faiss.read_index(path, flags | faiss.IO_FLAG_READ_ONLY)
+
+
+# ---------------------------
+# Index types (chosen at ingest time)
+# ---------------------------
+# flat      exact search, no training (default; fine up to ~100k vectors)
+# hnsw      graph index, best latency/recall trade-off, more memory, no training
+# ivf_flat  inverted lists over k-means cells, exact distances inside probed cells
+# ivf_pq    inverted lists + product quantization: smallest memory, approximate distances
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+CONFIG_FILE = "index_config.json"
+# vectors are added / scanned in slices of this many rows, so a memory-mapped
+# vector file (streaming ingest) is paged in piece by piece instead of all at once
+ADD_BATCH = 65536
+
+
+def default_nlist(n_vectors: int) -> int:
+    """~4*sqrt(n) cells, but keep >= 39 training points per cell (faiss k-means minimum)."""
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+def build_index(vectors: np.ndarray, index_type: str = "flat", **params) -> Tuple[faiss.Index, Dict[str, Any]]:
+    """
+    Build (and train, if needed) an index of the given type over `vectors`.
+    Returns the index and the config to store next to it (build + search parameters).
+    """
+    n, d = vectors.shape
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {INDEX_TYPES}")
+
+    config: Dict[str, Any] = {"type": index_type, "dim": d}
+    if index_type == "hnsw":
+        config["M"] = int(params.get("hnsw_m") or 32)
+        index = faiss.IndexHNSWFlat(d, config["M"])
+        index.hnsw.efConstruction = config["efConstruction"] = int(params.get("ef_construction") or 80)
+        config["efSearch"] = int(params.get("ef_search") or 64)
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        config["nlist"] = int(params.get("nlist") or default_nlist(n))
+        config["nprobe"] = int(params.get("nprobe") or max(1, config["nlist"] // 16))
+        if index_type == "ivf_flat":
+            factory = f"IVF{config['nlist']},Flat"
+        else:
+            config["pq_m"] = int(params.get("pq_m") or 48)
+            config["pq_nbits"] = int(params.get("pq_nbits") or 8)
+            if d % config["pq_m"]:
+                raise ValueError(f"pq_m={config['pq_m']} must divide the embedding dimension {d}")
+            factory = f"IVF{config['nlist']},PQ{config['pq_m']}x{config['pq_nbits']}"
+        index = faiss.index_factory(d, factory)
+        min_train = max(39 * config["nlist"], 2 ** config.get("pq_nbits", 0))
+        if n < min_train:
+            print(f"⚠️ {n} vectors is too few to train {factory} (need {min_train}); falling back to flat.")
+            return build_index(vectors, "flat")
+        train_size = int(params.get("train_size") or min(n, 256 * config["nlist"]))
+        sample = vectors[np.sort(np.random.default_rng(0).choice(n, size=min(n, train_size), replace=False))]
+        index.train(np.ascontiguousarray(sample, dtype=np.float32))
+    else:
+        index = faiss.IndexFlatL2(d)
+
+    add_in_batches(index, vectors)
+    configure_index(index, config)
+    return index, config
+
+
+def add_in_batches(index: faiss.Index, vectors: np.ndarray) -> None:
+    for start in range(0, len(vectors), ADD_BATCH):
+        index.add(np.ascontiguousarray(vectors[start:start + ADD_BATCH], dtype=np.float32))
+
+
+def configure_index(index: faiss.Index, config: Dict[str, Any]) -> None:
+    """Apply search-time parameters (nprobe / efSearch) from the saved config."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and config.get("nprobe"):
+        ivf.nprobe = int(config["nprobe"])
+    if isinstance(index, faiss.IndexHNSW) and config.get("efSearch"):
+        index.hnsw.efSearch = int(config["efSearch"])
+
+
+def enable_reconstruct(index: faiss.Index) -> None:
+    """reconstruct() (used for MMR re-ranking) needs a direct map on IVF indexes; flat / HNSW support it as is."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and ivf.direct_map.no():
+        ivf.make_direct_map()
+
+
+def search_parameters(index: faiss.Index, selector: Optional[faiss.IDSelector] = None,
+                      effort: int = 1) -> Optional[faiss.SearchParameters]:
+    """
+    SearchParameters of the right subclass for `index`, carrying its configured
+    nprobe / efSearch (a bare SearchParameters object would reset them to defaults).
+    effort > 1 searches harder: nprobe (up to nlist) / efSearch (up to ntotal) are
+    multiplied by it, for selective filters that leave too few rows in the probed cells.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=min(ivf.nlist, ivf.nprobe * effort))
+    if isinstance(index, faiss.IndexHNSW):
+        ef = index.hnsw.efSearch
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=max(ef, min(index.ntotal, ef * effort)))
+    return faiss.SearchParameters(sel=selector) if selector is not None else None
+
+
+def max_search_effort(index: faiss.Index) -> int:
+    """Smallest effort at which search_parameters probes every IVF cell / lets efSearch reach ntotal (1 for flat)."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return max(1, math.ceil(ivf.nlist / ivf.nprobe))
+    if isinstance(index, faiss.IndexHNSW):
+        return max(1, math.ceil(index.ntotal / index.hnsw.efSearch))
+    return 1
+
+
+def save_index_config(directory: str, config: Dict[str, Any]) -> None:
+    with open(os.path.join(directory, CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+
+
+def load_index_config(directory: str) -> Dict[str, Any]:
+    path = os.path.join(directory, CONFIG_FILE)
+    if not os.path.exists(path):
+        return {"type": "flat"}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ---------------------------
+# Recall / latency report against the exact baseline
+# ---------------------------
+def exact_search(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Brute-force top-k ids, scanning `vectors` in slices (it may be a memory-mapped file)."""
+    heap = faiss.ResultHeap(len(queries), k)
+    for start in range(0, len(vectors), ADD_BATCH):
+        distances, ids = faiss.knn(queries, np.ascontiguousarray(vectors[start:start + ADD_BATCH], dtype=np.float32), k)
+        heap.add_result(distances, np.where(ids >= 0, ids + start, -1))
+    heap.finalize()
+    return heap.I
+
+
+def recall_report(index: faiss.Index, vectors: np.ndarray, k: int = 10, n_queries: int = 200) -> Dict[str, Any]:
+    """
+    Compare `index` with exact search on a sample of the indexed vectors
+    (slightly perturbed so they behave like real queries rather than exact duplicates).
+    """
+    rng = np.random.default_rng(0)
+    n, d = vectors.shape
+    queries = vectors[np.sort(rng.choice(n, size=min(n_queries, n), replace=False))].astype(np.float32)
+    queries += rng.normal(scale=0.01, size=queries.shape).astype(np.float32)
+
+    def timed(search):
+        start = time.perf_counter()
+        ids = search()
+        return ids, (time.perf_counter() - start) * 1000 / len(queries)
+
+    exact_ids, flat_ms = timed(lambda: exact_search(vectors, queries, k))
+    approx_ids, ann_ms = timed(lambda: index.search(queries, k)[1])
+    hits = sum(len(set(a[a != -1]) & set(e[e != -1])) for a, e in zip(approx_ids, exact_ids))
+    return {
+        "queries": len(queries),
+        "k": k,
+        f"recall@{k}": round(hits / exact_ids.size, 4),
+        "flat_ms_per_query": round(flat_ms, 4),
+        "index_ms_per_query": round(ann_ms, 4),
+        "speedup": round(flat_ms / ann_ms, 2) if ann_ms else None,
+    }
+
+def write_index_atomic(index: faiss.Index, path: str) -> None:
+    """Write next to the target and rename, so servers with the old file mmapped are unaffected."""
+    tmp = path + ".tmp"
+    faiss.write_index(index, tmp)
+    os.replace(tmp, path)
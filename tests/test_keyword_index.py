@@ -0,0 +1,48 @@
+from src.keyword_index import KeywordIndex
+
+
+class Store:
+    """Stands in for MetadataStore: only rows and string(row, field) are used by KeywordIndex."""
+
+    def __init__(self, records):
+        self.records = records
+        self.rows = len(records)
+
+    def string(self, row, field):
+        return self.records[row].get(field, "")
+
+
+def catalogue():
+    # 31 projects, 83 variant rows: "gurukripa" has 6 variants, "om makarand heights" 5, the rest 2-3
+    records = []
+    records += [{"slug": "gurukripa", "projectName": "Gurukripa", "locality": "Chembur"}] * 6
+    records += [{"slug": "om-makarand-heights", "projectName": "Om Makarand Heights", "locality": "Ghatkopar"}] * 5
+    n = 0
+    while len(records) < 83:
+        variants = 3 if n < 14 else 2
+        records += [{"slug": f"project-{n}", "projectName": f"Tower {n}", "locality": "Mumbai"}] * variants
+        n += 1
+    return records
+
+
+def test_project_names_with_many_variants_are_scored():
+    index = KeywordIndex.from_store(Store(catalogue()))
+    assert index.n_projects == 31
+    rows = index.search("gurukripa", k=10, max_df=0.05)
+    assert sorted(rows) == list(range(6))
+    rows = index.search("makarand heights", k=10, max_df=0.05)
+    assert sorted(rows) == list(range(6, 11))
+
+
+def test_common_terms_are_skipped():
+    index = KeywordIndex.from_store(Store(catalogue()))
+    assert index.search("mumbai", k=10, max_df=0.05) == []
+    assert index.search("tower", k=10, max_df=0.05) == []
+
+
+def test_save_load_keeps_project_df(tmp_path):
+    index = KeywordIndex.from_store(Store(catalogue()))
+    index.save(str(tmp_path))
+    loaded = KeywordIndex.load(str(tmp_path), mmap=True)
+    assert loaded.n_projects == 31
+    assert loaded.search("gurukripa", k=3, max_df=0.05) == index.search("gurukripa", k=3, max_df=0.05)
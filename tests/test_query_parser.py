@@ -0,0 +1,101 @@
+import pytest
+
+from src.query_parser import QueryParser
+
+DICTIONARY = {"city": ["Pune", "Mumbai"], "locality": ["Baner", "Andheri", "Wakad"], "project": ["Lodha Park"]}
+
+
+def rupees(value):
+    return None if value is None else pytest.approx(value)
+
+
+@pytest.fixture(scope="module")
+def parser():
+    return QueryParser(DICTIONARY)
+
+
+@pytest.mark.parametrize("query, low, high", [
+    # upper cues
+    ("2bhk in pune under 1 cr", None, 1e7),
+    ("3BHK flat in Pune under ₹1.2 Cr", None, 1.2e7),
+    ("flats below 80 lakh", None, 80e5),
+    ("up to 1.5 crore in baner", None, 1.5e7),
+    ("less than 90 lakhs", None, 90e5),
+    ("budget 75 lacs", None, 75e5),
+    ("flats 1 cr or less", None, 1e7),
+    ("flats under rs. 12,00,000", None, 12e5),
+    ("flats under 12000000", None, 1.2e7),
+    ("2bhk 12000000", None, 1.2e7),
+    # lower cues
+    ("over 1 cr in pune", 1e7, None),
+    ("more than 80 lakh", 80e5, None),
+    ("min 1 cr", 1e7, None),
+    ("3BHK above 2 cr", 2e7, None),
+    ("starting at 60 lakh in wakad", 60e5, None),
+    ("at least 1.2cr", 1.2e7, None),
+    ("1 cr and above in andheri", 1e7, None),
+    ("80 lakh onwards", 80e5, None),
+    # ranges
+    ("2bhk between 50 lakh and 1 cr", 50e5, 1e7),
+    ("from 60 lakh to 1.2 crore", 60e5, 1.2e7),
+    ("between 50 and 80 lakh", 50e5, 80e5),
+    ("50-80 lakh in baner", 50e5, 80e5),
+    ("₹1 cr to ₹80 lakh", 80e5, 1e7),
+    # an amount with a unit but no cue is not a filter
+    ("flats around 1 cr", None, None),
+    # small numbers without unit or ₹ / rs are not prices, even after a cue
+    ("flats within 2 km of station", None, None),
+    ("under 5 years old flats in pune", None, None),
+    ("max 3 floors", None, None),
+    ("between 2 and 5 km from metro", None, None),
+    ("under ₹90000", None, 9e4),
+    ("under rs 5000", None, 5e3),
+    ("2bhk in pune", None, None),
+])
+def test_budget_direction(parser, query, low, high):
+    parsed = parser.parse(query)
+    assert parsed["min_budget_rupees"] == rupees(low)
+    assert parsed["budget_rupees"] == rupees(high)
+
+
+def test_lower_cue_keeps_other_filters(parser):
+    parsed = parser.parse("3BHK above 2 cr in baner")
+    assert parsed["bhk"] == "3BHK"
+    assert parsed["locality_or_project"] == "Baner"
+    assert parsed["budget_rupees"] is None
+
+
+def test_cue_words_end_unknown_place(parser):
+    assert parser.parse("flats in kharadi over 1 cr")["locality_or_project"] == "Kharadi"
+    assert parser.parse("flats in kharadi more than 1 cr")["locality_or_project"] == "Kharadi"
+
+
+@pytest.mark.parametrize("query, status", [
+    ("good luck finding a flat in pune", None),
+    ("uc 2bhk in pune", "UNDER_CONSTRUCTION"),
+    ("under construction 2bhk under 1 cr", "UNDER_CONSTRUCTION"),
+    ("under-construction flats in baner", "UNDER_CONSTRUCTION"),
+    ("ready-to-move 3bhk mumbai", "READY_TO_MOVE"),
+    ("ready to move flats", "READY_TO_MOVE"),
+    ("rtm 1bhk", "READY_TO_MOVE"),
+])
+def test_status(parser, query, status):
+    assert parser.parse(query)["status"] == status
+
+
+def test_under_construction_is_not_a_budget(parser):
+    parsed = parser.parse("under construction 2bhk under 1 cr")
+    assert parsed["budget_rupees"] == pytest.approx(1e7)
+    assert parsed["bhk"] == "2BHK"
+
+
+@pytest.mark.parametrize("query, bhk", [("2bhk", "2BHK"), ("3 BHK", "3BHK"), ("2-bhk flats", "2BHK")])
+def test_bhk(parser, query, bhk):
+    assert parser.parse(query)["bhk"] == bhk
+
+
+def test_places(parser):
+    parsed = parser.parse("2bhk in lodha park baner pune")
+    assert parsed["city"] == "Pune"
+    assert parsed["locality_or_project"] == "Lodha Park"
+    assert parser.parse("flats in andheri")["locality_or_project"] == "Andheri"
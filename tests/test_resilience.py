@@ -0,0 +1,268 @@
+import asyncio
+
+import pytest
+
+from src import resilience
+from src.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, LLMGuard, LLMUnavailable
+
+
+class Clock:
+    """Stands in for the time module inside resilience: monotonic() is set by the test, sleep() is instant."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        pass
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    # replace the module's reference only: asyncio keeps the real clock
+    monkeypatch.setattr(resilience, "time", clock)
+    return clock
+
+
+def make_guard(retries=2, failures=3, reset_after=30.0, timeout=1.0):
+    # backoff_base=0: retries don't wait
+    return LLMGuard(timeout=timeout, retries=retries, backoff_base=0.0, backoff_max=0.0,
+                    breaker=CircuitBreaker(failures, reset_after))
+
+
+def failing(error, calls):
+    def fn():
+        calls.append(1)
+        raise error
+    return fn
+
+
+# ---------------------------
+# CircuitBreaker
+# ---------------------------
+def test_breaker_closed_open_half_open_closed(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_after=30)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()  # the single half-open trial
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+    assert breaker.transitions == {CLOSED: 1, OPEN: 1, HALF_OPEN: 1}
+
+
+def test_success_resets_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_failed_trial_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_after=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    clock.now += 10
+    assert breaker.allow()
+
+
+def test_release_frees_trial_slot(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_after=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.release()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+def test_snapshot_time_in_state(clock):
+    breaker = CircuitBreaker(failure_threshold=1)
+    clock.now += 5
+    breaker.record_failure()
+    clock.now += 2
+    snapshot = breaker.snapshot()
+    assert snapshot["state"] == OPEN
+    assert snapshot["seconds_in_state"][CLOSED] == 5.0
+    assert snapshot["seconds_in_state"][OPEN] == 2.0
+
+
+# ---------------------------
+# LLMGuard.call
+# ---------------------------
+def test_call_retries_transient_errors(clock):
+    guard = make_guard(retries=2)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise StatusError(503)
+        return "ok"
+
+    assert guard.call(flaky) == "ok"
+    assert len(calls) == 3
+    assert guard.counters["retries"] == 2
+    assert guard.counters["successes"] == 1
+    assert guard.breaker.state == CLOSED
+
+
+@pytest.mark.parametrize("status", [400, 401, 404])
+def test_call_does_not_retry_client_errors(clock, status):
+    guard = make_guard(retries=2)
+    calls = []
+    with pytest.raises(LLMUnavailable):
+        guard.call(failing(StatusError(status), calls))
+    assert len(calls) == 1
+    assert guard.counters["retries"] == 0
+    assert guard.counters["failures"] == 1
+
+
+@pytest.mark.parametrize("status", [408, 429, 500])
+def test_call_retries_timeouts_rate_limits_and_5xx(clock, status):
+    guard = make_guard(retries=1)
+    calls = []
+    with pytest.raises(LLMUnavailable):
+        guard.call(failing(StatusError(status), calls))
+    assert len(calls) == 2
+
+
+def test_call_opens_circuit_then_rejects(clock):
+    guard = make_guard(retries=0, failures=2)
+    calls = []
+    for _ in range(2):
+        with pytest.raises(LLMUnavailable):
+            guard.call(failing(StatusError(503), calls))
+    assert guard.breaker.state == OPEN
+    with pytest.raises(LLMUnavailable, match="circuit open"):
+        guard.call(failing(StatusError(503), calls))
+    assert len(calls) == 2
+    assert guard.counters["rejected"] == 1
+
+
+# ---------------------------
+# LLMGuard.acall / astream
+# ---------------------------
+def test_acall_deadline(clock):
+    guard = make_guard(retries=1, timeout=0.01)
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    with pytest.raises(LLMUnavailable):
+        asyncio.run(guard.acall(slow))
+    assert guard.counters["timeouts"] == 2
+    assert guard.breaker.snapshot()["consecutive_failures"] == 1
+
+
+def test_acall_cancel_releases_trial(clock):
+    guard = make_guard(failures=1, reset_after=10)
+    guard.breaker.record_failure()
+    clock.now += 10
+
+    async def main():
+        task = asyncio.create_task(guard.acall(lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0)
+        assert not guard.breaker.allow()  # the trial slot is taken by the task
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert guard.breaker.state == HALF_OPEN
+    assert guard.breaker.allow()
+
+
+async def chunks(items, fail_after=None, error=None):
+    for n, item in enumerate(items):
+        if n == fail_after:
+            raise error
+        yield item
+    if fail_after == len(items):
+        raise error
+
+
+def collect(guard, factory):
+    """Drain guard.astream(factory): (chunks received, LLMUnavailable raised or None)."""
+    received = []
+
+    async def main():
+        async for chunk in guard.astream(factory):
+            received.append(chunk)
+
+    try:
+        asyncio.run(main())
+    except LLMUnavailable as e:
+        return received, e
+    return received, None
+
+
+def test_astream_retries_before_first_chunk(clock):
+    guard = make_guard(retries=1)
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            return chunks([], fail_after=0, error=StatusError(503))
+        return chunks(["a", "b"])
+
+    assert collect(guard, factory) == (["a", "b"], None)
+    assert len(attempts) == 2
+    assert guard.breaker.state == CLOSED
+
+
+def test_astream_mid_stream_failure_is_not_retried(clock):
+    guard = make_guard(retries=2, failures=1)
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        return chunks(["a", "b", "c"], fail_after=2, error=StatusError(503))
+
+    received, error = collect(guard, factory)
+    assert received == ["a", "b"]
+    assert "stream interrupted" in str(error)
+    assert len(attempts) == 1
+    assert guard.breaker.state == OPEN
+
+
+def test_astream_closed_early_releases_trial(clock):
+    guard = make_guard(failures=1, reset_after=10)
+    guard.breaker.record_failure()
+    clock.now += 10
+
+    async def main():
+        stream = guard.astream(lambda: chunks(["a", "b"]))
+        assert await stream.__anext__() == "a"
+        await stream.aclose()  # client went away
+
+    asyncio.run(main())
+    assert guard.breaker.state == HALF_OPEN
+    assert guard.breaker.allow()